@@ -1,8 +1,13 @@
+import mmap
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Union
+from typing import Sequence, Union
 
 from expose_text.formats import registry
+from expose_text.formats._utils import BatchedAlterations, sorted_alters
 
 registry.register_formats()
 
@@ -43,9 +48,26 @@ class BinaryWrapper:
     >>> bw.text
     'That is the new content as string!'
 
+    Inside a batch, slice assignments are only applied when the block exits. Their indices still refer to the text as if
+    the previous assignments were already applied.
+
+    >>> with bw.batch():
+    ...     bw[0:4] = 'This'
+    ...     bw[4:7] = ' was'
+    ...     bw[9:12] = 'a'
+    >>> bw.text
+    'This was a new content as string!'
+
+    Many alterations can also be queued at once, e.g. from the parallel arrays of an NER model.
+
+    >>> bw.add_alters([23, 9], [25, 10], ['for', 'one'])
+    >>> bw.apply_alters()
+    >>> bw.text
+    'This was one new content for string!'
+
     Return the content in binary format.
     >>> bw.bytes
-    b'That is the new content as string!'
+    b'This was one new content for string!'
     """
 
     def __init__(self, bytes_: bytes, format_cls_or_str: Union[type, str]):
@@ -62,6 +84,8 @@ class BinaryWrapper:
 
         self.file = format_cls_or_str()
         self.file.load(bytes_)
+        self._input_bytes = bytes_
+        self._batch = None
 
     @property
     def text(self) -> str:
@@ -70,8 +94,16 @@ class BinaryWrapper:
 
     @property
     def bytes(self) -> bytes:
-        """The binary content of the file."""
-        return self.file.bytes
+        """The binary content of the file.
+
+        As long as no alterations were applied, these are the input bytes as they are.
+        """
+        return self.file.bytes if self.dirty else bytes(self._input_bytes)
+
+    @property
+    def dirty(self) -> bool:
+        """Whether alterations were applied since the file was loaded."""
+        return self.file.dirty
 
     def add_alter(self, start: int, end: int, text: str):
         """Queue a new change up for alteration.
@@ -81,20 +113,52 @@ class BinaryWrapper:
         """
         self.file.add_alter(start, end, text)
 
+    def add_alters(self, starts: Sequence[int], ends: Sequence[int], texts: Sequence[str]):
+        """Queue many alterations given as parallel sequences (or NumPy arrays) of starts, ends and texts.
+
+        The alterations are validated against the bounds of `text` and each other in one pass before they are queued.
+        Apply them by calling `apply_alters()`.
+        """
+        self.file.add_alters(sorted_alters(starts, ends, texts, len(self.file)))
+
     def apply_alters(self):
         """Apply all queued alterations."""
         self.file.apply_alters()
 
+    @contextmanager
+    def batch(self):
+        """Queue all slice assignments inside the `with` block and apply them in one pass when it exits.
+
+        The indices of each assignment refer to the text with all previous assignments of the batch applied, just like
+        outside of a batch. Reading the text inside the block still returns the text from before the batch. If the block
+        raises an exception, the queued assignments are discarded.
+        """
+        if self._batch is not None:
+            raise RuntimeError("Batches cannot be nested!")
+
+        self._batch = BatchedAlterations()
+        try:
+            yield self
+            batch = self._batch
+        finally:
+            self._batch = None
+
+        if len(batch) > 0:
+            self.file.add_alters(batch)
+            self.apply_alters()
+
     def __getitem__(self, key: Union[slice, int]):
         """Get a substring of the contained text using slicing or indexing."""
-        return self.file.text.__getitem__(key)
+        return self.file[key]
 
     def __setitem__(self, key: Union[slice, int], value: str):
-        """Add and apply one alter using the slicing syntax."""
-        if isinstance(key, slice):
-            self.add_alter(key.start, key.stop, value)
-        else:
-            self.add_alter(key, key + 1, value)
+        """Add and apply one alter using the slicing syntax (or queue it, if inside a batch)."""
+        start, end = (key.start, key.stop) if isinstance(key, slice) else (key, key + 1)
+        if self._batch is not None:
+            self._batch.add(start, end, value)
+            return
+
+        self.add_alter(start, end, value)
         self.apply_alters()
 
 
@@ -136,21 +200,49 @@ class FileWrapper(BinaryWrapper):
     >>> fw.save(root / 'tests/files/doctest_altered.txt')
     """
 
-    def __init__(self, file_path: Union[Path, str], format_cls: type = None):
+    def __init__(self, file_path: Union[Path, str], format_cls: Union[type, str] = None):
         """
         Constructor
 
         :param file_path: Path to input file
-        :param format_cls: Specific Format class (if not set, class is determined based on file extension)
+        :param format_cls: Specific Format class or file extension string (if not set, class is determined based on file
+            extension)
         """
-        _, extension = os.path.splitext(file_path)
+        if format_cls is None:
+            _, format_cls = os.path.splitext(file_path)
+        if isinstance(format_cls, str):
+            format_cls = registry.find_format(format_cls)
 
         with open(file_path, "rb") as f:
-            bytes_ = f.read()
+            if format_cls.streaming and os.fstat(f.fileno()).st_size > 0:
+                # streaming formats read the file lazily, empty files cannot be mapped
+                bytes_ = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                bytes_ = f.read()
 
-        super().__init__(bytes_, format_cls if format_cls else extension)
+        super().__init__(bytes_, format_cls)
+        self._file_path = file_path
 
     def save(self, file_path: Union[Path, str]):
-        """Save the file to disk."""
+        """Save the file to disk.
+
+        If no alterations were applied, the input file is copied, which the OS can do without passing the data through
+        Python (e.g. with `sendfile` on Linux).
+        """
+        if not self.dirty:
+            try:
+                shutil.copyfile(self._file_path, file_path)
+            except shutil.SameFileError:
+                pass
+            return
+
+        if self.file.streaming and os.path.exists(file_path) and os.path.samefile(self._file_path, file_path):
+            # the input file is still read while writing, so replace it only when done
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)))
+            with os.fdopen(fd, "wb") as f:
+                self.file.write(f)
+            os.replace(tmp_path, file_path)
+            return
+
         with open(file_path, "wb") as f:
-            f.write(self.file.bytes)
+            self.file.write(f)
@@ -1,90 +1,394 @@
+import copy
 import io
 import re
+import struct
 import zipfile
+import zlib
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from xml.parsers import expat
 
-from defusedxml.minidom import parse
+from defusedxml.common import EntitiesForbidden, ExternalReferenceForbidden
 
-from expose_text.formats._utils import apply_buffer_to_text
+from expose_text.formats._utils import AlterationsBuffer, apply_buffer_to_text, bom_encoding
 from expose_text.formats.base import Format
-from expose_text.formats.markup.utils import MarkupModifier, Mapper
+from expose_text.formats.markup.utils import IndexMapping, MarkupModifier, Mapper
 
 
 class DocxFormat(Format):
+    """The text of all text parts of a DOCX file, i.e. the document, headers, footers, footnotes, endnotes and comments.
+
+    The text of the parts is concatenated with `PART_SEPARATOR` in between, see `part_spans` for the boundaries. The
+    parts without text are left out when loading; a part whose text is deleted later keeps its (empty) span and
+    separators, such that the layout of the text only changes by the alterations. An alteration spanning several parts
+    is applied to each of them, the separators are not altered. An alteration of only a separator is dropped.
+    """
+
+    PART_SEPARATOR = "\n\n"
+
+    # if set, the parts are extracted and mapped concurrently on a process pool with this many workers
+    max_workers = None
+
     _docx_container = None
     _text = ""
-    _xml_modifier = None
+    _parts = None
 
     def load(self, bytes_):
+        self._mark_clean()
         self._docx_container = DocxContainer(bytes_)
 
-        mapper = DocxMapper(self._docx_container.document_xml)
-        self._text, mapping = mapper.simultaneous_text_extraction_and_mapping()
+        part_names = self._docx_container.text_part_names()
+        xmls = [self._docx_container.read(name) for name in part_names]
+        if self.max_workers is not None and len(xmls) > 1:
+            with ProcessPoolExecutor(self.max_workers) as executor:
+                loaded_parts = list(executor.map(load_part, xmls))
+        else:
+            loaded_parts = list(map(load_part, xmls))
 
-        self._xml_modifier = MarkupModifier(self._docx_container.document_xml, mapping)
+        parts = (DocxPart(name, *loaded) for name, loaded in zip(part_names, loaded_parts))
+        self._parts = [part for part in parts if part.text]
+        self._update_text()
 
     @property
     def text(self):
         return self._text
 
+    @property
+    def part_spans(self):
+        """The `(part_name, start, end)` of each part that had text when loaded, in order of their occurrence in `text`."""
+        return [(part.name, start, end) for part, start, end in self._spans]
+
     @property
     def bytes(self):
-        return self._docx_container.to_bytes()
+        if self._bytes is None:
+            self._bytes = self._docx_container.to_bytes()
+        return self._bytes
 
     def apply_alters(self):
-        self._text = apply_buffer_to_text(self._buffer, self._text)
-        self._docx_container.document_xml = self._xml_modifier.apply_buffer(self._buffer)
+        if len(self._buffer) == 0:
+            return  # nothing to apply, keep the cached bytes
+        for part, buffer in self._split_buffer():
+            part.text = apply_buffer_to_text(buffer, part.text)
+            self._docx_container.write(part.name, part.xml_modifier.apply_buffer(buffer), part.encoding)
         self._buffer.clear()
+        self._update_text()
+        self._mark_dirty()
+
+    def _split_buffer(self):
+        """Split the queued alterations into one buffer per touched part, using the indices of the part's text."""
+        buffers = {}
+        ends = [end for _, _, end in self._spans]
+        for start, end, new_text in self._buffer.sort():
+            # the first part that the alteration touches gets the new text, the further ones are cut; an alteration
+            # of only a separator (and emptied parts) touches no text and is dropped
+            i = bisect_right(ends, start)
+            while i < len(self._spans) and self._spans[i][1] < end:
+                _, part_start, part_end = self._spans[i]
+                i += 1
+                if part_start == part_end:
+                    continue
+                clipped_start = max(start, part_start) - part_start
+                clipped_end = min(end, part_end) - part_start
+                buffers.setdefault(i - 1, AlterationsBuffer()).add(clipped_start, clipped_end, new_text)
+                new_text = ""
+        return [(self._spans[i][0], buffer) for i, buffer in sorted(buffers.items())]
+
+    def _update_text(self):
+        self._spans = []
+        pos = 0
+        for part in self._parts:
+            if self._spans:
+                pos += len(self.PART_SEPARATOR)
+            self._spans.append((part, pos, pos + len(part.text)))
+            pos += len(part.text)
+        self._text = self.PART_SEPARATOR.join(part.text for part in self._parts)
+
+
+class DocxPart:
+    def __init__(self, name, encoding, text, xml_modifier):
+        self.name = name
+        self.encoding = encoding
+        self.text = text
+        self.xml_modifier = xml_modifier
+
+
+def load_part(xml_bytes):
+    """Decode an XML part and extract its text; returns the encoding, the text and a `MarkupModifier` for the XML.
+
+    This is a module level function such that it can be run on a process pool.
+    """
+    encoding = detect_xml_encoding(xml_bytes)
+    xml = xml_bytes.decode(encoding)
+    text, mapping = DocxMapper(xml).simultaneous_text_extraction_and_mapping()
+    return encoding, text, MarkupModifier(xml, mapping)
 
 
 class DocxContainer:
+    """The zip file of a DOCX document.
+
+    Rebuilding the zip file recompresses only the replaced parts. The other members are copied as raw records, i.e. with
+    their local header, compressed data and data descriptor, and their central directory records are reused. ZIP64
+    files and files whose directory doesn't match what `zipfile` read are rebuilt with `zipfile` instead.
+    """
+
     _docx = None
-    document_xml = None
+    _bytes = None
+    _modified = None
+    _directory = None
+    _record_ends = None
 
     def __init__(self, bytes_):
+        self._bytes = bytes_
         docx_io = io.BytesIO(bytes_)
         self._docx = zipfile.ZipFile(docx_io)
+        self._modified = {}
+
+        directory = read_central_directory(bytes_)
+        offsets = [zinfo.header_offset for zinfo in self._docx.infolist()]
+        if directory is not None and [offset for offset, _ in directory[1]] == offsets:
+            self._directory = directory[1]
+            # each member's record (local header, data and data descriptor) ends where the next one or the directory
+            # starts
+            offsets = sorted(offsets) + [directory[0]]
+            self._record_ends = dict(zip(offsets, offsets[1:]))
 
-        document_xml_bytes = self._docx.read("word/document.xml")
+    def text_part_names(self):
+        """The names of the parts that contain text, the main document first."""
+        names = [name for name in self._docx.namelist() if _TEXT_PART_PATTERN.fullmatch(name)]
+        return sorted(names, key=lambda name: name != "word/document.xml")
 
-        document_xml_io = io.BytesIO(document_xml_bytes)
-        encoding = parse(document_xml_io).encoding
+    def read(self, name):
+        return self._docx.read(name)
 
-        self.document_xml = document_xml_bytes.decode(encoding)
+    def write(self, name, xml, encoding):
+        """Replace the XML of a part, only the replaced parts are rebuilt in `to_bytes()`."""
+        self._modified[name] = xml.encode(encoding)
 
     def to_bytes(self):
-        # modifying a zip file is not supported, thus it has to be rebuilt
+        if self._directory is None:
+            return self._rebuild()
+
+        out = io.BytesIO()
+        central_records = []
+        for zinfo, (offset, central_record) in zip(self._docx.infolist(), self._directory):
+            header_offset = out.tell()
+            if zinfo.filename in self._modified:
+                local_record, central_record = build_records(central_record, self._modified[zinfo.filename])
+                out.write(local_record)
+            else:
+                out.write(memoryview(self._bytes)[offset : self._record_ends[offset]])
+            central_records.append(central_record[:42] + struct.pack("<L", header_offset) + central_record[46:])
+
+        directory_offset = out.tell()
+        for central_record in central_records:
+            out.write(central_record)
+        if out.tell() > _ZIP_MAX:
+            return self._rebuild()  # needs ZIP64
+        count = len(central_records)
+        out.write(
+            struct.pack("<4s4H2LH", b"PK\x05\x06", 0, 0, count, count, out.tell() - directory_offset, directory_offset, 0)
+        )
+        return out.getvalue()
+
+    def _rebuild(self):
+        """Rebuild the zip file with `zipfile`, which decompresses and recompresses each member."""
         bytes_io = io.BytesIO()
-        zout = zipfile.ZipFile(bytes_io, "w")
-        for zinfo in self._docx.infolist():
-            if zinfo.filename == "word/document.xml":
-                zout.writestr(zinfo, self.document_xml)
-                continue
-
-            buffer = self._docx.read(zinfo.filename)
-            zout.writestr(zinfo, buffer)
-        zout.close()
+        with zipfile.ZipFile(bytes_io, "w") as zout:
+            for zinfo in self._docx.infolist():
+                data = self._modified.get(zinfo.filename)
+                zout.writestr(copy.copy(zinfo), self._docx.read(zinfo) if data is None else data)
         return bytes_io.getvalue()
 
 
+def read_central_directory(bytes_):
+    """Return the offset of the central directory of a zip file and the `(header_offset, record)` of each member.
+
+    Returns `None` for ZIP64 files, which `DocxContainer` doesn't rebuild itself.
+    """
+    eocd = bytes_.rfind(b"PK\x05\x06", max(0, len(bytes_) - 22 - 0xFFFF))
+    if eocd < 0:
+        return None
+    disk, directory_disk, _, count, _, directory_offset, _ = struct.unpack_from("<4H2LH", bytes_, eocd + 4)
+    if disk or directory_disk or count == 0xFFFF or directory_offset == _ZIP_MAX:
+        return None
+
+    records = []
+    pos = directory_offset
+    for _ in range(count):
+        if bytes_[pos : pos + 4] != b"PK\x01\x02":
+            return None
+        name_length, extra_length, comment_length = struct.unpack_from("<3H", bytes_, pos + 28)
+        end = pos + 46 + name_length + extra_length + comment_length
+        records.append((struct.unpack_from("<L", bytes_, pos + 42)[0], bytes(bytes_[pos:end])))
+        pos = end
+    return directory_offset, records
+
+
+def build_records(central_record, data):
+    """Build the local record of a member with new data and update its central directory record accordingly.
+
+    The member keeps its name, comment, time and attributes. It is deflated, unless it was stored uncompressed.
+    """
+    made_by, _, flags, method, time, date, _, _, _, name_length, extra_length, comment_length, disk, internal, external, _ = (
+        struct.unpack_from("<4x6H3L5H2L", central_record)
+    )
+    name = central_record[46 : 46 + name_length]
+    comment = central_record[46 + name_length + extra_length :]
+
+    if method != zipfile.ZIP_STORED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        method = zipfile.ZIP_DEFLATED
+    else:
+        compressed = data
+    flags &= 0x800  # only keep the flag for UTF-8 names
+    crc = zlib.crc32(data)
+
+    local_header = struct.pack(
+        "<4s5H3L2H", b"PK\x03\x04", 20, flags, method, time, date, crc, len(compressed), len(data), name_length, 0
+    )
+    central_record = struct.pack(
+        "<4s6H3L5H2L",
+        b"PK\x01\x02",
+        made_by,
+        20,
+        flags,
+        method,
+        time,
+        date,
+        crc,
+        len(compressed),
+        len(data),
+        name_length,
+        0,
+        comment_length,
+        disk,
+        internal,
+        external,
+        0,
+    )
+    return local_header + name + compressed, central_record + name + comment
+
+
+def detect_xml_encoding(xml_bytes):
+    """Detect the encoding of an XML document from its byte order mark or its XML declaration.
+
+    >>> detect_xml_encoding(b'<?xml version="1.0" encoding="ISO-8859-1"?><a/>')
+    'ISO-8859-1'
+    """
+    encoding = bom_encoding(xml_bytes)
+    if encoding:
+        return encoding
+
+    m = _XML_DECLARATION_PATTERN.match(xml_bytes[:1024])
+    return m.group(1).decode("ascii") if m else "utf-8"
+
+
+def create_parser(encoding=None):
+    """Create an expat parser that, like defusedxml, forbids entity declarations and external references.
+
+    This makes e.g. the billion laughs attack fail.
+    """
+
+    def forbid_entity_decl(name, is_parameter_entity, value, base, sysid, pubid, notation_name):
+        raise EntitiesForbidden(name, value, base, sysid, pubid, notation_name)
+
+    def forbid_unparsed_entity_decl(name, base, sysid, pubid, notation_name):
+        raise EntitiesForbidden(name, None, base, sysid, pubid, notation_name)
+
+    def forbid_external_ref(context, base, sysid, pubid):
+        raise ExternalReferenceForbidden(context, base, sysid, pubid)
+
+    parser = expat.ParserCreate(encoding)
+    parser.EntityDeclHandler = forbid_entity_decl
+    parser.UnparsedEntityDeclHandler = forbid_unparsed_entity_decl
+    parser.ExternalEntityRefHandler = forbid_external_ref
+    return parser
+
+
+_ZIP_MAX = 0xFFFFFFFF  # larger offsets and sizes need ZIP64
+_TEXT_PART_PATTERN = re.compile(r"word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml")
+_XML_DECLARATION_PATTERN = re.compile(rb"""<\?xml[^>]*?encoding\s*=\s*["']([A-Za-z][\w.-]*)["']""")
+
+
 class DocxMapper(Mapper):
+    """Extract the text of the `<w:t>` elements and its index mapping from WordprocessingML in one streaming pass.
+
+    The XML is fed to expat in chunks. Paragraph ends and line breaks become newlines, and the byte offsets expat reports
+    for each event are translated into the indices of the markup string.
+    """
+
+    chunk_size = 1 << 20
+
     def simultaneous_text_extraction_and_mapping(self):
-        # get plain text from word/document.xml (everything between <w:t ...> and </w:t>)
-        self._remove_pattern(r"\n")  # get rid of all newlines from the xml formatting
-        self._remove_pattern(r"<\/w:p>|<w:br[^>]*>", replace_with="\n")  # add newlines from paragraph ends and linebreaks
-        self._remove_pattern(r"<\/w:t>.*?<w:t[^>]*>", flags=re.MULTILINE)  # delete content from text close to open tags
-        self._remove_pattern(r"^.*<w:t[^>]*>", flags=re.MULTILINE)  # delete to remaining open tags
-        self._remove_pattern(r"<\/w:t>.*$", flags=re.MULTILINE)  # delete from remaining close tags
-        self._remove_pattern(r"^.*<.*$", flags=re.MULTILINE)  # delete leftover lines with xml content
-
-        # unescape characters
-        self._remove_pattern(r"&amp;", replace_with="&")
-        self._remove_pattern(r"&lt;", replace_with="<")
-        self._remove_pattern(r"&gt;", replace_with=">")
-        self._remove_pattern(r"&quot;", replace_with='"')
-        self._remove_pattern(r"&apos;", replace_with="'")
+        markup = self._markup
+        parser = create_parser("utf-8")
 
-        # remove leading and trailing newlines
-        self._remove_pattern(r"^\n+")
-        self._remove_pattern(r"\n+$")
+        pieces = []
+        mapping = IndexMapping()
+        in_text = 0
+        after_start = False  # used to tell empty elements like <w:p/> apart from closed ones
+
+        if markup.isascii():
+            encoded = None
+        else:
+            encoded = markup.encode("utf-8")
+            cursor = [0, 0]  # the last translated byte offset and its markup index
+
+        def markup_idx():
+            byte_idx = parser.CurrentByteIndex
+            if encoded is None:
+                return byte_idx
+            cursor[1] += len(encoded[cursor[0] : byte_idx].decode("utf-8"))
+            cursor[0] = byte_idx
+            return cursor[1]
+
+        def start_element(name, attrs):
+            nonlocal in_text, after_start
+            after_start = True
+            if name == "w:t":
+                in_text += 1
+            elif name == "w:br":
+                pieces.append("\n")
+                mapping.append(markup_idx())
 
+        def end_element(name):
+            nonlocal in_text, after_start
+            if name == "w:t":
+                in_text -= 1
+            elif name == "w:p":
+                idx = markup_idx()
+                if not (after_start and markup.startswith("/>", idx - 2)):
+                    pieces.append("\n")
+                    mapping.append(idx)
+            after_start = False
+
+        def character_data(data):
+            nonlocal after_start
+            after_start = False
+            if not in_text or data == "\n":  # newlines are part of the xml formatting
+                return
+
+            idx = markup_idx()
+            pieces.append(data)
+            if markup.startswith("&", idx):  # an escaped character
+                mapping.append(idx)
+            else:
+                mapping.append(idx, len(data))
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+
+        source = markup if encoded is None else memoryview(encoded)
+        for start in range(0, len(source), self.chunk_size):
+            parser.Parse(source[start : start + self.chunk_size], False)
+        parser.Parse(b"", True)
+
+        # remove leading and trailing newlines
+        text = "".join(pieces)
+        start = len(text) - len(text.lstrip("\n"))
+        self._text = text.strip("\n")
+        self._text_to_markup_idx = IndexMapping()
+        self._text_to_markup_idx.extend(mapping, start, start + len(self._text))
         return self._text, self._text_to_markup_idx
@@ -1,25 +1,31 @@
 import html
 import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 
 from bs4 import UnicodeDammit
 
-from expose_text.formats._utils import apply_buffer_to_text
+from expose_text.formats._utils import apply_buffer_to_text, bom_encoding
 from expose_text.formats.base import Format
-from expose_text.formats.markup.utils import MarkupModifier, Mapper
+from expose_text.formats.markup.utils import IndexMapping, MarkupModifier, Mapper, Rule, find_tags
 
 
 class HtmlFormat(Format):
+    # if set, large documents are split into chunks that are tokenized on a process pool with this many workers
+    max_workers = None
+
     _html = ""
     _text = ""
     _html_modifier = None
 
     def load(self, bytes_):
+        self._mark_clean()
         self._html = to_unicode(bytes_)
 
-        mapper = HtmlMapper(self._html)
+        mapper = HtmlMapper(self._html, max_workers=self.max_workers)
         self._text, mapping = mapper.simultaneous_text_extraction_and_mapping()
 
-        self._html_modifier = MarkupModifier(self._html, mapping)
+        self._html_modifier = MarkupModifier(self._html, mapping, mapper.tags)
 
     @property
     def text(self):
@@ -27,61 +33,250 @@ class HtmlFormat(Format):
 
     @property
     def bytes(self):
-        return self._html.encode("UTF-8")
+        if self._bytes is None:
+            self._bytes = self._html.encode("UTF-8")
+        return self._bytes
 
     def apply_alters(self):
+        if len(self._buffer) == 0:
+            return  # nothing to apply, keep the cached bytes
         self._text = apply_buffer_to_text(self._buffer, self._text)
         self._html = self._html_modifier.apply_buffer(self._buffer)
         self._buffer.clear()
+        self._mark_dirty()
 
 
 def to_unicode(bytes_):
-    def unescape_html(html_):
-        unescaped_html = ""
-        pattern = re.compile(r"&#\d{1,4};|&\w{1,6};")
-        cur = 0
-        for m in pattern.finditer(html_):
-            if m.group(0) in ["&lt;", "&gt;", "&amp;", "&quot;", "&apos;"]:
-                continue
+    """Decode the HTML and unescape its character references, except the ones of the XML special characters.
+
+    The encoding is taken from a byte order mark or a charset declared in the first KB. If there is none, UTF-8 is tried
+    and only if that fails too, the slower detection of `UnicodeDammit` is used.
+    """
+    for encoding in [detect_html_encoding(bytes_) or "utf-8", "utf-8"]:
+        try:
+            decoded_html = bytes_.decode(encoding)
+            break
+        except (UnicodeDecodeError, LookupError):
+            pass
+    else:
+        decoded_html = bytes_.decode(UnicodeDammit(bytes_).original_encoding)
+
+    # split into text and character references and unescape each distinct reference only once
+    parts = _CHARREF_PATTERN.split(decoded_html)
+    charrefs = parts[1::2]
+    unescaped = {charref: charref if charref in _XML_CHARREFS else html.unescape(charref) for charref in set(charrefs)}
+    parts[1::2] = [unescaped[charref] for charref in charrefs]
+    return "".join(parts)
+
+
+def detect_html_encoding(bytes_):
+    """Detect the encoding of HTML from its byte order mark or the charset of a `<meta>` tag in the first KB.
 
-            unescaped_html += html_[cur : m.start()] + html.unescape(m.group(0))
-            cur = m.end()
-        unescaped_html += html_[cur:]
-        return unescaped_html
+    >>> detect_html_encoding(b'<html><head><meta http-equiv="Content-Type" content="text/html; charset=ISO-8859-1">')
+    'ISO-8859-1'
+    """
+    encoding = bom_encoding(bytes_)
+    if encoding:
+        return encoding
 
-    dammit = UnicodeDammit(bytes_)
-    encoding = dammit.original_encoding
-    decoded_html = bytes_.decode(encoding)
-    return unescape_html(decoded_html)
+    m = _META_CHARSET_PATTERN.search(bytes_[:1024])
+    if m is None:
+        return None
+    encoding = m.group(1).decode("ascii")
+    # as the meta tag could be read, the document is not encoded in UTF-16 or UTF-32 whatever it declares
+    return "utf-8" if encoding.lower().startswith(("utf-16", "utf-32")) else encoding
+
+
+_META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]*?charset\s*=\s*["']?\s*([A-Za-z][\w.:-]*)""", re.IGNORECASE)
+_CHARREF_PATTERN = re.compile(r"(&#\d{1,4};|&\w{1,6};)")
+_XML_CHARREFS = {"&lt;", "&gt;", "&amp;", "&quot;", "&apos;"}
 
 
 class HtmlMapper(Mapper):
-    def simultaneous_text_extraction_and_mapping(self):
-        # get rid of everything but body and title
-        self._remove_pattern(r"^.*<body[^>]*>", flags=re.DOTALL)  # delete everything from beginning to body
-        self._remove_pattern(r"<\/body>.*$", flags=re.DOTALL)  # delete everything from body to end
-
-        # remove html from inside body
-        self._remove_pattern(r"<br ?\/?>", replace_with="\n")  # html linebreaks
-        self._remove_pattern(
-            r"""<script[^>]*>.*?<\/script>  # remove scripts
-                |<style[^>]*>.*?<\/style>  # remove styles
-                |<template[^>]*>.*?<\/template> # remove templates
-                |<[^>]+>  # remove all tags """,
-            flags=re.DOTALL | re.VERBOSE,
-        )
-        self._remove_pattern(r"(^[ \xc2\xa0]+)", flags=re.MULTILINE)  # leading (non-breaking) whitespace
-        self._remove_pattern(r"(\n\r?){3,}", replace_with="\n\n")  # excess newlines
+    """Extract the text of HTML in one pass of a tokenizer, followed by the rules that clean up the text.
 
-        # unescape characters
-        self._remove_pattern(r"&amp;", replace_with="&")
-        self._remove_pattern(r"&lt;", replace_with="<")
-        self._remove_pattern(r"&gt;", replace_with=">")
-        self._remove_pattern(r"&quot;", replace_with='"')
-        self._remove_pattern(r"&apos;", replace_with="'")
+    The tokenizer keeps only the content of the body (if there is one), turns `<br>` into newlines and removes all tags,
+    scripts, styles and templates. The character references are kept as they are and unescaped by the rules.
+    """
 
+    rules = [
+        Rule(r"(^[ \xc2\xa0]+)", flags=re.MULTILINE),  # leading (non-breaking) whitespace
+        Rule(r"(\n\r?){3,}", replace_with="\n\n"),  # excess newlines
+        # unescape characters
+        Rule(r"&amp;", replace_with="&"),
+        Rule(r"&lt;", replace_with="<"),
+        Rule(r"&gt;", replace_with=">"),
+        Rule(r"&quot;", replace_with='"'),
+        Rule(r"&apos;", replace_with="'"),
         # remove leading and trailing newlines
-        self._remove_pattern(r"^\n+")
-        self._remove_pattern(r"\n+$")
+        Rule(r"^\n+"),
+        Rule(r"\n+$"),
+    ]
+
+    def __init__(self, markup, max_workers=None, chunk_size=1 << 24):
+        """
+        :param markup: the HTML
+        :param max_workers: if set, markup longer than `chunk_size` is split into chunks at safe positions, which are
+            tokenized on a process pool with this many workers
+        :param chunk_size: the approximate number of characters per chunk
+        """
+        super().__init__(markup)
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        # the `(starts, ends)` of the tags as `find_tags()` returns them, if they were found while tokenizing in chunks
+        self.tags = None
+
+    def simultaneous_text_extraction_and_mapping(self):
+        if self.max_workers is None or len(self._markup) <= self.chunk_size:
+            segments = scan_html(self._markup)
+        else:
+            bounds = split_html(self._markup, self.chunk_size)
+            chunks = [self._markup[start:end] for start, end in bounds]
+            offsets = [start for start, _ in bounds]
+            segments = []
+            self.tags = (array("q"), array("q"))
+            with ProcessPoolExecutor(self.max_workers) as executor:
+                for chunk_segments, tag_starts, tag_ends in executor.map(scan_html_chunk, chunks, offsets):
+                    segments.extend(chunk_segments)
+                    self.tags[0].extend(tag_starts)
+                    self.tags[1].extend(tag_ends)
 
+        text, mapping = join_segments(segments)
+        self._text, self._text_to_markup_idx = self.program().run(text, mapping)
         return self._text, self._text_to_markup_idx
+
+
+def scan_html(markup, pos=0, endpos=None):
+    """Tokenize `markup[pos:endpos]` in a single pass and return the text between the tags, split at the body tags.
+
+    The result is a list of `(marker, text, mapping)` segments, where `marker` is the body tag ("body" or "body_end")
+    in front of the segment or `None` for the first segment. `<br>` tags become newlines. The `mapping` holds the
+    positions of the text in `markup`.
+
+    >>> [(marker, text) for marker, text, mapping in scan_html("<head><title>T</title></head><body><p>A<br>B</p>")]
+    [(None, 'T'), ('body', 'A\\nB')]
+    """
+    endpos = len(markup) if endpos is None else endpos
+    segments = []
+    marker = None
+    pieces = []
+    mapping = IndexMapping()
+    cur = pos
+    for m in _TOKEN_PATTERN.finditer(markup, pos, endpos):
+        start = m.start()
+        if cur < start:
+            pieces.append(markup[cur:start])
+            mapping.append(cur, start - cur)
+        cur = m.end()
+
+        token = m.lastgroup
+        if token == "br":
+            pieces.append("\n")
+            mapping.append(start)
+        elif token in ("body", "body_end"):
+            segments.append((marker, "".join(pieces), mapping))
+            marker = token
+            pieces = []
+            mapping = IndexMapping()
+    if cur < endpos:
+        pieces.append(markup[cur:endpos])
+        mapping.append(cur, endpos - cur)
+    segments.append((marker, "".join(pieces), mapping))
+    return segments
+
+
+def scan_html_chunk(chunk, offset):
+    """Run `scan_html()` and `find_tags()` on a chunk that starts at `offset` in the markup, e.g. on a process pool.
+
+    Returns the segments and the tag starts and ends, with their positions shifted to the markup. As the chunks of
+    `split_html()` end after a `>`, no tag is cut and the tags of all chunks are the tags of the markup.
+    """
+    segments = []
+    for marker, text, mapping in scan_html(chunk):
+        shifted_mapping = IndexMapping()
+        shifted_mapping.extend(mapping, 0, len(mapping), offset)
+        segments.append((marker, text, shifted_mapping))
+    return (segments, *find_tags(chunk, offset))
+
+
+def split_html(markup, chunk_size):
+    """Return the `(start, end)` bounds of chunks of about `chunk_size` characters that can be tokenized separately.
+
+    The chunks are split after a `>` that is not inside a script, style, template or comment, so no token of
+    `scan_html()` is cut.
+
+    >>> split_html("<p>A</p><script>x</script><p>B</p>", 5)
+    [(0, 8), (8, 26), (26, 34)]
+    """
+    bounds = []
+    start = 0
+    while start + chunk_size < len(markup):
+        end = markup.find(">", start + chunk_size) + 1
+        scanned = start
+        while end > 0:
+            closing, scanned = _unclosed_element(markup, scanned, end)
+            if closing is None:
+                break
+            # continue after the end of the element
+            closed = markup.find(closing, end)
+            end = markup.find(">", closed) + 1 if closed >= 0 else 0
+        if end <= 0 or end >= len(markup):
+            break
+        bounds.append((start, end))
+        start = end
+    bounds.append((start, len(markup)))
+    return bounds
+
+
+def _unclosed_element(markup, pos, end):
+    """Return the closing tag of the script, style, template or comment that `end` is in or `None`.
+
+    The markup is scanned forward from `pos`, which must not be inside such an element. The position from which a scan
+    for a later `end` can continue is returned as well.
+    """
+    while True:
+        m = _SKIPPED_OPENING_PATTERN.search(markup, pos, end)
+        if m is None:
+            return None, end
+        closing = _SKIPPED_ELEMENTS[m.group()]
+        closed = markup.find(closing, m.start(), end)
+        if closed < 0:
+            return closing, m.start()
+        pos = closed + len(closing)
+
+
+def join_segments(segments):
+    """Join the text of the segments of `scan_html()` that is part of the last body, or all of it if there is none."""
+    pieces = []
+    mapping = IndexMapping()
+    ended = False
+    for marker, text, segment_mapping in segments:
+        if marker == "body":
+            pieces = []
+            mapping = IndexMapping()
+            ended = False
+        elif marker == "body_end":
+            ended = True
+
+        if not ended:
+            pieces.append(text)
+            mapping.extend(segment_mapping, 0, len(segment_mapping))
+    return "".join(pieces), mapping
+
+
+_SKIPPED_ELEMENTS = {
+    "<script": "</script>",
+    "<style": "</style>",
+    "<template": "</template>",
+    "<!--": "-->",
+}
+_SKIPPED_OPENING_PATTERN = re.compile("|".join(map(re.escape, _SKIPPED_ELEMENTS)))
+# the tokens that are removed from the HTML, tried in this order at each position
+_TOKEN_PATTERN = re.compile(
+    r"""(?P<skipped><script[^>]*>.*?</script>|<style[^>]*>.*?</style>|<template[^>]*>.*?</template>)
+    |(?P<br><br\ ?/?>)
+    |(?P<body><body[^>]*>)
+    |(?P<body_end></body>)
+    |(?P<tag><[^>]+>)""",
+    flags=re.DOTALL | re.VERBOSE,
+)
@@ -1,4 +1,7 @@
 import io
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain
 
 from pdfrw import PdfReader, PdfDict, PdfWriter
 from pdfrw import PdfArray
@@ -21,35 +24,128 @@ class PdfFormat(Format):
 
     options = None  # type: RedactorOptions
     document = None
-    text_tokens = None
-    page_tokens = None
-
-    def load(self, bytes_):
+    max_workers = None
+    _pages = None
+    _page_layers = None
+    _fontcache = None
+    _text_tokens = None
+    _text = None
+    _token_offsets = None
+    _token_pages = None
+    _dirty_pages = None
+
+    def load(self, bytes_, pages=None):
+        """Load the PDF, its pages are only tokenized when their text is needed.
+
+        :param pages: the indices of the pages whose text makes up `text`, all pages if not given
+        """
+        self._mark_clean()
         self.options = pdf_redactor.RedactorOptions()
         self.options.input_stream = bytes_
 
         self.document = PdfReader(fdata=bytes_)
-        self.text_tokens, self.page_tokens = pdf_redactor.build_text_layer(self.document, self.options)
+        self._pages = range(self.page_count) if pages is None else sorted(set(pages))
+        self._page_layers = {}
+        self._fontcache = {}
+        self._dirty_pages = set()
+        self._text_tokens = None
+        self._invalidate_text()
+
+    @property
+    def page_count(self):
+        return len(self.document.pages)
+
+    def page_text(self, page):
+        """Get the text of a single page, only this page is tokenized for it."""
+        return "".join(t.value for t in self._page_layer(page)[0])
+
+    def _page_layer(self, page):
+        """Return the text tokens and all tokens of a page, tokenizing it on first access."""
+        if page not in self._page_layers:
+            self._page_layers[page] = pdf_redactor.build_page_text_layer(
+                self.document.pages[page], page, self._fontcache, self.options
+            )
+        return self._page_layers[page]
+
+    @property
+    def text_tokens(self):
+        """The text tokens of the selected pages, building it tokenizes all of these pages."""
+        if self._text_tokens is None:
+            # with max_workers, the pages are tokenized on a process pool
+            pages = [page for page in self._pages if page not in self._page_layers]
+            layers = pdf_redactor.build_page_text_layers(
+                self.document.pages, pages, self._fontcache, self.options, self.max_workers
+            )
+            self._page_layers.update(zip(pages, layers))
+            self._text_tokens = [token for page in self._pages for token in self._page_layer(page)[0]]
+            self._token_pages = array("q", (t.page for t in self._text_tokens))
+        return self._text_tokens
 
     @property
     def text(self):
-        return "".join(t.value for t in self.text_tokens)
+        if self._text is None:
+            self._text = "".join(t.value for t in self.text_tokens)
+        return self._text
+
+    @property
+    def token_offsets(self):
+        """The character offsets at which each text token starts, followed by the length of the text."""
+        if self._token_offsets is None:
+            self._token_offsets = array("q", accumulate(chain((0,), (len(t.value) for t in self.text_tokens))))
+        return self._token_offsets
+
+    def __getitem__(self, key):
+        if self._text is not None:
+            return self._text[key]
+
+        # only join the values of the tokens that make up the requested part of the text
+        offsets = self.token_offsets
+        if isinstance(key, slice):
+            start, stop, step = key.indices(offsets[-1])
+            if step != 1 or start >= stop:
+                return self.text[key]
+        else:
+            start = key + offsets[-1] if key < 0 else key
+            if not 0 <= start < offsets[-1]:
+                raise IndexError("string index out of range")
+            stop = start + 1
+
+        first = bisect_right(offsets, start) - 1
+        last = bisect_left(offsets, stop)
+        text = "".join(t.value for t in self.text_tokens[first:last])
+        return text[start - offsets[first] : stop - offsets[first]]
+
+    def page_span(self, page):
+        """Return the start and end index of the given page's content in `text`."""
+        offsets = self.token_offsets  # builds the token pages too
+        first = bisect_left(self._token_pages, page)
+        last = bisect_left(self._token_pages, page + 1)
+        return offsets[first], offsets[last]
+
+    def _invalidate_text(self):
+        self._text = None
+        self._token_offsets = None
 
     @property
     def bytes(self):
-        stream = io.BytesIO()
-        writer = PdfWriter()
-        writer.trailer = self.document
-        writer.write(stream)
-        return stream.getvalue()
+        if self._bytes is None:
+            stream = io.BytesIO()
+            writer = PdfWriter()
+            writer.trailer = self.document
+            writer.write(stream)
+            self._bytes = stream.getvalue()
+        return self._bytes
 
     def apply_alters(self):
-        # Finding all matches...
-        text_tokens_index = 0
-        text_tokens_charpos = 0
-        text_tokens_token_xdiff = 0
+        if len(self._buffer) == 0:
+            return  # nothing to apply, keep the cached bytes
         text_tokens = self.text_tokens
 
+        # The offsets refer to the text before any alteration is applied, so keep track of how much the value of
+        # each token changed with the alterations applied so far.
+        token_offsets = self.token_offsets
+        token_xdiffs = {}
+
         # Mostly from update_text_layer
         # Pass the matched text to the replacement function to get replaced text.
         for start, end, alteration in self._buffer.sort():
@@ -57,34 +153,25 @@ class PdfFormat(Format):
             start_idx = start
             end_idx = end
 
+            # Find the first token in the content stream that produced the matched text.
+            text_tokens_index = bisect_right(token_offsets, start_idx) - 1
+
             # Do a text replacement in the tokens that produced this text content.
             # It may have been produced by multiple tokens, so loop until we find them all.
-            while start_idx < end_idx:
-                # Find the original tokens in the content stream that
-                # produced the matched text. Start by advancing over any
-                # tokens that are entirely before this span of text.
-                while (
-                    text_tokens_index < len(text_tokens)
-                    and text_tokens_charpos + len(text_tokens[text_tokens_index].value) - text_tokens_token_xdiff <= start_idx
-                ):
-                    text_tokens_charpos += len(text_tokens[text_tokens_index].value) - text_tokens_token_xdiff
-                    text_tokens_index += 1
-                    text_tokens_token_xdiff = 0
-                if text_tokens_index == len(text_tokens):
-                    break
-                assert text_tokens_charpos <= start_idx
-
+            while start_idx < end_idx and text_tokens_index < len(text_tokens):
                 # The token at text_tokens_index, and possibly subsequent ones,
                 # are responsible for this text. Replace the matched content
                 # here with replacement content.
                 tok = text_tokens[text_tokens_index]
+                text_tokens_charpos = token_offsets[text_tokens_index]
+                text_tokens_token_xdiff = token_xdiffs.get(text_tokens_index, 0)
 
                 # Where does this match begin within the token's text content?
                 mpos = start_idx - text_tokens_charpos
                 assert mpos >= 0
 
                 # How long is the match within this token?
-                mlen = min(end_idx - start_idx, len(tok.value) - text_tokens_token_xdiff - mpos)
+                mlen = min(end_idx - start_idx, token_offsets[text_tokens_index + 1] - text_tokens_charpos - mpos)
                 assert mlen >= 0
 
                 # How much should we replace here?
@@ -103,13 +190,17 @@ class PdfFormat(Format):
                 tok.value = (
                     tok.value[: mpos + text_tokens_token_xdiff] + r + tok.value[mpos + mlen + text_tokens_token_xdiff :]
                 )
-                text_tokens_token_xdiff += len(r) - mlen
+                token_xdiffs[text_tokens_index] = text_tokens_token_xdiff + len(r) - mlen
+                self._dirty_pages.add(tok.page)
 
                 # Advance for next iteration.
                 start_idx += mlen
+                text_tokens_index += 1
 
         # Replace page content streams with updated tokens.
         self.apply_updated_text()
+        self._invalidate_text()
+        self._mark_dirty()
 
     def tok_str(self, tok):
         # Replace the page's content stream with our updated tokens.
@@ -132,16 +223,21 @@ class PdfFormat(Format):
         return str(tok)
 
     def apply_updated_text(self):
-        # Create a new content stream for each page by concatenating the
-        # tokens in the page_tokens lists.
-
-        for i, page in enumerate(self.document.pages):
+        # Create a new content stream for each page with a modified token by
+        # concatenating the tokens in its token list.
+
+        # The other pages keep their original content streams, which may be
+        # compressed or shared with other pages.
+        for i in sorted(self._dirty_pages):
+            token_list = self._page_layers[i][1]
+            page = self.document.pages[i]
             if page.Contents is None:
                 continue  # nothing was here
 
             page.Contents = PdfDict()
-            page.Contents.stream = "\n".join(self.tok_str(tok) for tok in self.page_tokens[i])
+            page.Contents.stream = "\n".join(self.tok_str(tok) for tok in token_list)
 
             page.Contents.Length = len(page.Contents.stream)  # reset
 
+        self._dirty_pages.clear()
         self._buffer.clear()
@@ -1,4 +1,9 @@
-from expose_text.formats._utils import apply_buffer_to_text
+import codecs
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain
+
+from expose_text.formats._utils import BatchedAlterations, apply_buffer_to_text, detect_bom
 from expose_text.formats.base import Format
 
 # chardet is LGPL, link it dynamically
@@ -9,17 +14,117 @@ except ModuleNotFoundError:
 
 
 class TxtFormat(Format):
+    """A plain text file in any encoding.
+
+    The encoding is detected with the first of these strategies that succeeds:
+
+    - "bom": the byte order mark at the start of the file
+    - "utf-8": decoding the whole file as UTF-8, which is fast and rarely succeeds by chance for other encodings
+    - "chardet": chardet's guess on the first `sample_size` bytes, if its confidence is at least `min_confidence` and
+      the whole file can be decoded with it
+    - "fallback": Latin-1, which decodes any bytes and encodes them back unchanged
+
+    The file is decoded in chunks of `chunk_size` bytes, recording a sparse index of the character and byte offsets at
+    each chunk boundary. The applied alterations are remapped to the indices of the original text. The output is built
+    from the original bytes of the unaltered ranges and the encoded new strings, so untouched bytes are kept exactly as
+    they were.
+    """
+
     _encoding = None
+    _confidence = None
+    _strategy = None
     _content = ""
 
+    _source = None
+    _codec = None
+    _content_start = 0  # the length of the byte order mark
+    _checkpoint_chars = None
+    _checkpoint_bytes = None
+    _char_width = 1  # the smallest number of bytes that a character takes in the codec
+    _alters = None
+
+    def __init__(self, sample_size=1 << 16, min_confidence=0.0, chunk_size=1 << 16):
+        """
+        :param sample_size: the maximal number of bytes that chardet looks at (it is pure Python and slow on large files)
+        :param min_confidence: the confidence below which a guess of chardet is not used (per default any guess that
+            decodes the file is used, chardet reports low confidences for single byte encodings even when it is right)
+        :param chunk_size: the number of bytes decoded at once and the distance between the entries of the byte index
+        """
+        super().__init__()
+        self.sample_size = sample_size
+        self.min_confidence = min_confidence
+        self.chunk_size = chunk_size
+
     def load(self, bytes_):
+        self._mark_clean()
+        self._source = memoryview(bytes_)
+
+        self._content_start = 0
+        bom = detect_bom(self._source)
+        if bom:
+            encoding, codec, self._content_start = bom
+            self._index(codec, 1.0, "bom", encoding)
+            return
+
+        try:
+            self._index("utf-8", 1.0, "utf-8")
+            return
+        except UnicodeDecodeError:
+            pass
+
         if chardet:
-            self._encoding = chardet.detect(bytes_)["encoding"]
-        else:
-            # if the encoding is not detected dynamically, it is assumed to be UTF-8
-            self._encoding = "UTF-8"
+            guess = chardet.detect(bytes(self._source[: self.sample_size]))
+            if guess["encoding"] and guess["confidence"] >= self.min_confidence:
+                try:
+                    self._index(guess["encoding"], guess["confidence"], "chardet")
+                    return
+                except (UnicodeDecodeError, LookupError):
+                    pass
+
+        self._index("latin-1", 0.0, "fallback")
+
+    def _index(self, codec, confidence, strategy, encoding=None):
+        """Decode the file chunk by chunk and record the character and byte offset at the end of each chunk."""
+        decoder = codecs.getincrementaldecoder(codec)()
+        chars = array("q", [0])
+        bytes_ = array("q", [self._content_start])
+        chunks = []
+        for pos in range(self._content_start, len(self._source), self.chunk_size):
+            end = min(pos + self.chunk_size, len(self._source))
+            chunk = decoder.decode(self._source[pos:end], end == len(self._source))
+            if not self.streaming:
+                chunks.append(chunk)
+            chars.append(chars[-1] + len(chunk))
+            # bytes of an incomplete character at the end of the chunk are buffered by the decoder
+            bytes_.append(end - len(decoder.getstate()[0]))
 
-        self._content = bytes_.decode(self._encoding)
+        self._content = "".join(chunks)
+        self._codec = codec
+        self._encoding = encoding or codec
+        self._confidence = confidence
+        self._strategy = strategy
+        self._checkpoint_chars = chars
+        self._checkpoint_bytes = bytes_
+        self._char_width = len("a".encode(codec))
+        self._reset_alters()
+
+    def _reset_alters(self):
+        self._alters = BatchedAlterations()
+
+    @property
+    def encoding(self):
+        """The detected encoding."""
+        return self._encoding
+
+    @property
+    def confidence(self):
+        """The confidence in the detected encoding, between 0 and 1."""
+        return self._confidence
+
+    @property
+    def strategy(self):
+        """The strategy that detected the encoding, see the class docstring."""
+        return self._strategy
 
     @property
     def text(self):
@@ -27,8 +132,159 @@ class TxtFormat(Format):
 
     @property
     def bytes(self):
-        return self._content.encode(self._encoding)
+        if self._bytes is None:
+            self._bytes = b"".join(self._output_chunks())
+        return self._bytes
+
+    def write(self, f):
+        for chunk in self._output_chunks():
+            f.write(chunk)
+
+    def _output_chunks(self):
+        """Yield the original bytes of the unaltered ranges, at most `chunk_size` at once, and the encoded new texts."""
+        yield self._source[: self._content_start]
+        alters = list(self._original_alters())
+        byte_offsets = self._byte_offsets(chain.from_iterable((start, end) for start, end, _ in alters))
+        pos = self._content_start
+        for _, _, new_text in alters:
+            start, end = next(byte_offsets), next(byte_offsets)
+            yield from self._source_chunks(pos, start)
+            if new_text:
+                yield new_text.encode(self._codec)
+            pos = end
+        yield from self._source_chunks(pos, len(self._source))
+
+    def _source_chunks(self, start, end):
+        for pos in range(start, end, self.chunk_size):
+            yield self._source[pos : min(pos + self.chunk_size, end)]
+
+    def _original_alters(self):
+        """Yield the applied alterations as sorted `(start, end, new_text)` tuples of indices of the original text."""
+        return iter(self._alters)
+
+    def _byte_offsets(self, char_offsets):
+        """Yield the byte offsets of ascending character offsets of the original text in one forward pass.
+
+        In a chunk whose characters all take the smallest width of the codec, the offsets are computed directly. Other
+        chunks are decoded once and only the text between consecutive offsets is encoded.
+        """
+        chars, bytes_ = self._checkpoint_chars, self._checkpoint_bytes
+        i = chunk = -1
+        for char_idx in char_offsets:
+            i = bisect_right(chars, char_idx, max(i, 0)) - 1
+            if chars[i] == char_idx:
+                yield bytes_[i]
+            elif bytes_[i + 1] - bytes_[i] == self._char_width * (chars[i + 1] - chars[i]):
+                yield bytes_[i] + self._char_width * (char_idx - chars[i])
+            else:
+                if i != chunk:
+                    chunk = i
+                    text = codecs.decode(self._source[bytes_[i] : bytes_[i + 1]], self._codec)
+                    pos_char, pos_byte = chars[i], bytes_[i]
+                pos_byte += len(text[pos_char - chars[i] : char_idx - chars[i]].encode(self._codec))
+                pos_char = char_idx
+                yield pos_byte
+
+    def _decode(self, start, end):
+        """Decode the characters from `start` to `end` of the original text."""
+        first = bisect_right(self._checkpoint_chars, start) - 1
+        last = bisect_left(self._checkpoint_chars, end)
+        text = codecs.decode(self._source[self._checkpoint_bytes[first] : self._checkpoint_bytes[last]], self._codec)
+        offset = self._checkpoint_chars[first]
+        return text[start - offset : end - offset]
 
     def apply_alters(self):
+        if len(self._buffer) == 0:
+            return  # nothing to apply, keep the cached bytes
         self._content = apply_buffer_to_text(self._buffer, self._content)
+        # from right to left, so the indices of the alterations still to add are not shifted
+        for start, end, new_text in self._buffer.sort(reverse=True):
+            self._alters.add(start, end, new_text)
+
+        self._buffer.clear()
+        self._mark_dirty()
+
+
+class StreamingTxtFormat(TxtFormat):
+    """A plain text file that is decoded lazily, for files too large to hold their text in memory.
+
+    `load()` accepts any bytes-like object, e.g. a memory map of the file (`FileWrapper` maps the file for streaming
+    formats). The decoded text is not kept: slicing only decodes the chunks that contain the requested part, and
+    `write()` streams the output chunk by chunk. Accessing `text` or `bytes` still builds the whole string.
+
+    The altered text is tracked as a piece table: a list of pieces, which are either the `(start, end)` character range
+    of the original text or a new string.
+    """
+
+    streaming = True
+
+    _pieces = None
+    _piece_offsets = None
+
+    def _reset_alters(self):
+        self._set_pieces([(0, self._checkpoint_chars[-1])] if self._checkpoint_chars[-1] else [])
+
+    def __len__(self):
+        return self._piece_offsets[-1]
+
+    @property
+    def text(self):
+        return self[:]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return self.text[key]
+        else:
+            start = key + len(self) if key < 0 else key
+            if not 0 <= start < len(self):
+                raise IndexError("string index out of range")
+            stop = start + 1
+
+        return "".join(piece if isinstance(piece, str) else self._decode(*piece) for piece in self._cut_pieces(start, stop))
+
+    def _original_alters(self):
+        pos = 0
+        new_texts = []
+        for piece in chain(self._pieces, [(self._checkpoint_chars[-1], None)]):
+            if isinstance(piece, str):
+                new_texts.append(piece)
+                continue
+            if piece[0] != pos or new_texts:
+                yield pos, piece[0], "".join(new_texts)
+            pos = piece[1]
+            new_texts = []
+
+    def apply_alters(self):
+        if len(self._buffer) == 0:
+            return  # nothing to apply, keep the cached bytes
+        pieces = []
+        cur = 0
+        for start, end, new_text in self._buffer.sort():
+            pieces.extend(self._cut_pieces(cur, start))
+            if new_text:
+                pieces.append(new_text)
+            cur = end
+        pieces.extend(self._cut_pieces(cur, self._piece_offsets[-1]))
+        self._set_pieces(pieces)
+
         self._buffer.clear()
+        self._mark_dirty()
+
+    def _set_pieces(self, pieces):
+        self._pieces = pieces
+        lengths = (len(piece) if isinstance(piece, str) else piece[1] - piece[0] for piece in pieces)
+        self._piece_offsets = array("q", accumulate(chain((0,), lengths)))
+
+    def _cut_pieces(self, start, stop):
+        """Yield the pieces that make up `text[start:stop]`, the first and last one cut to size."""
+        offsets = self._piece_offsets
+        i = bisect_right(offsets, start) - 1
+        while start < stop:
+            piece_start = offsets[i]
+            cut_start, cut_end = start - piece_start, min(stop, offsets[i + 1]) - piece_start
+            piece = self._pieces[i]
+            yield piece[cut_start:cut_end] if isinstance(piece, str) else (piece[0] + cut_start, piece[0] + cut_end)
+            start = piece_start + cut_end
+            i += 1
@@ -1,3 +1,13 @@
+import codecs
+from bisect import bisect_left, bisect_right
+
+# numpy is optional, it only speeds up the validation of bulk alterations
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+
 class AlterationsBuffer:
     """This class is used to safely queue alterations.
 
@@ -8,14 +18,24 @@ class AlterationsBuffer:
     >>> buffer.add(0, 10, 'new_text')
     >>> buffer += (10, 20, 'new_text')
 
-    Access the alterations by using the iterable interface of this class.
+    Many alterations can be added at once, which is much faster than adding them one by one.
+
+    >>> buffer.add_many([(30, 40, 'new_text'), (20, 25, 'new_text')])
+
+    Access the alterations by using the iterable interface of this class. The alterations are always sorted by their
+    start index.
+
+    >>> [start for start, end, new_text in buffer]
+    [0, 10, 20, 30]
     """
 
     def __init__(self):
         self.buffer = []
+        self._starts = []
+        self._reverse = False
 
     def __iter__(self):
-        return iter(self.buffer)
+        return reversed(self.buffer) if self._reverse else iter(self.buffer)
 
     def __iadd__(self, alter):
         if not isinstance(alter, tuple) or len(alter) != 3:
@@ -30,30 +50,191 @@ class AlterationsBuffer:
         if not end > start:
             raise ValueError("end should be larger than start!")
 
-        alter = (start, end, new_text)
-        if self._overlaps_with_existing_alter(alter):
+        idx = bisect_right(self._starts, start)
+        if (idx > 0 and self.buffer[idx - 1][1] > start) or (idx < len(self._starts) and self._starts[idx] < end):
             raise ValueError("The given alteration overlaps with an existing one!")
 
-        self.buffer += [alter]
+        self.buffer.insert(idx, (start, end, new_text))
+        self._starts.insert(idx, start)
+
+    def add_many(self, alters):
+        """Add an iterable of `(start, end, new_text)` alterations at once.
+
+        The new alterations are sorted once and checked for overlaps in a single sweep. If any of them is invalid, none
+        of them is added.
+        """
+        new_alters = []
+        for alter in alters:
+            if not isinstance(alter, tuple) or len(alter) != 3:
+                raise TypeError("Invalid alteration! Valid ones are (start, end, new_text) tuples.")
+            if not alter[1] > alter[0]:
+                raise ValueError("end should be larger than start!")
+            new_alters.append(alter)
+
+        merged = sorted(self.buffer + new_alters, key=lambda alter: alter[0])
+        for previous, alter in zip(merged, merged[1:]):
+            if previous[1] > alter[0]:
+                raise ValueError("The given alteration overlaps with an existing one!")
+
+        self.buffer = merged
+        self._starts = [alter[0] for alter in merged]
 
     def sort(self, reverse=False):
-        self.buffer.sort(key=lambda alter: alter[0], reverse=reverse)
+        """Set the iteration order; the alterations themselves are always kept sorted by their start index."""
+        self._reverse = reverse
         return self
 
     def clear(self):
         self.buffer = []
+        self._starts = []
+        self._reverse = False
+
+
+class BatchedAlterations:
+    """This class queues alterations whose indices refer to the text with all previously queued ones applied.
+
+    Each new alteration is remapped to the indices of the original text. If it touches the replacement of an earlier
+    alteration, both are merged into a single one, so the result never contains overlapping alterations.
+
+    >>> batch = BatchedAlterations()
+    >>> batch.add(0, 4, 'That')
+    >>> batch.add(8, 11, 'one')
+    >>> batch.add(10, 12, 'ly ')
+    >>> list(batch)
+    [(0, 4, 'That'), (8, 12, 'only ')]
+
+    The virtual start indices of the queued alterations are kept like a gap buffer: the ones after the last alteration
+    added store their index minus a common offset, so a new alteration shifts all of them at once. Adding alterations
+    in ascending or descending order, or near the previous one, is O(log n) apart from the list insertion.
+    """
+
+    def __init__(self):
+        self._virt_starts = []
+        self._alters = []
+        self._gap = 0  # the virtual starts from this index on are stored without the offset
+        self._offset = 0
+
+    def __iter__(self):
+        return iter(self._alters)
+
+    def __len__(self):
+        return len(self._alters)
+
+    def add(self, start, end, new_text):
+        if not end > start:
+            raise ValueError("end should be larger than start!")
+
+        # the queued alterations that the new one touches are merged into it
+        lo = self._bisect(start)
+        if lo > 0 and self._virt_end(lo - 1) > start:
+            lo -= 1
+        hi = self._bisect(end)
+
+        if lo < hi and self._virt_start(lo) < start:
+            orig_start = self._alters[lo][0]
+            prefix = self._alters[lo][2][: start - self._virt_start(lo)]
+        else:
+            orig_start = self._to_orig(start, lo - 1)
+            prefix = ""
+
+        if lo < hi and self._virt_end(hi - 1) > end:
+            orig_end = self._alters[hi - 1][1]
+            suffix = self._alters[hi - 1][2][end - self._virt_start(hi - 1) :]
+        else:
+            orig_end = self._to_orig(end, hi - 1)
+            suffix = ""
+
+        # the alterations before the new one keep their index, the ones after it are shifted through the offset
+        self._move_gap(lo, hi)
+        self._alters[lo:hi] = [(orig_start, orig_end, prefix + new_text + suffix)]
+        self._virt_starts[lo:hi] = [start - len(prefix)]
+        self._gap = lo + 1
+        self._offset += len(new_text) - (end - start)
+
+    def _move_gap(self, lo, hi):
+        """Move the gap into `[lo, hi]`, converting the stored starts of the alterations it passes."""
+        starts, gap, offset = self._virt_starts, self._gap, self._offset
+        if gap < lo:
+            starts[gap:lo] = [virt_start + offset for virt_start in starts[gap:lo]]
+            self._gap = lo
+        elif gap > hi:
+            starts[hi:gap] = [virt_start - offset for virt_start in starts[hi:gap]]
+            self._gap = hi
 
-    def _overlaps_with_existing_alter(self, new_alter):
-        new_start = new_alter[0]
-        new_end = new_alter[1]
+    def _bisect(self, idx):
+        """Return the position of the first alteration that starts at `idx` or later."""
+        gap = self._gap
+        if gap < len(self._virt_starts) and self._virt_starts[gap] + self._offset < idx:
+            return bisect_left(self._virt_starts, idx - self._offset, gap)
+        return bisect_left(self._virt_starts, idx, 0, gap)
 
-        for existing_alter in self.buffer:
-            existing_start = existing_alter[0]
-            existing_end = existing_alter[1]
-            if existing_start <= new_start < existing_end or existing_start < new_end <= existing_end:
-                return True
+    def _virt_start(self, idx):
+        return self._virt_starts[idx] + (self._offset if idx >= self._gap else 0)
 
-        return False
+    def _virt_end(self, idx):
+        return self._virt_start(idx) + len(self._alters[idx][2])
+
+    def _to_orig(self, idx, previous):
+        """Map an index that lies after the alteration at `previous` back to the original text."""
+        if previous < 0:
+            return idx
+        return self._alters[previous][1] + idx - self._virt_end(previous)
+
+
+def sorted_alters(starts, ends, texts, text_length):
+    """Validate alterations given as parallel sequences and return them as a sorted list of tuples.
+
+    The starts and ends can be sequences or NumPy arrays. The bounds, the ordering of start and end and the overlaps
+    are checked in one sort-and-diff pass that is vectorized if NumPy is installed.
+
+    >>> sorted_alters([10, 0], [15, 5], ["kenobi", "yoda"], 20)
+    [(0, 5, 'yoda'), (10, 15, 'kenobi')]
+    """
+    if not len(starts) == len(ends) == len(texts):
+        raise ValueError("starts, ends and texts must have the same length!")
+    if len(starts) == 0:
+        return []
+
+    if np is not None:
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        order = np.argsort(starts, kind="stable")
+        starts, ends = starts[order], ends[order]
+        if not (ends > starts).all():
+            raise ValueError("end should be larger than start!")
+        if starts[0] < 0 or ends.max() > text_length:
+            raise IndexError("The given alteration is out of the text's bounds!")
+        if (ends[:-1] > starts[1:]).any():
+            raise ValueError("The given alteration overlaps with an existing one!")
+        return list(zip(starts.tolist(), ends.tolist(), (texts[idx] for idx in order.tolist())))
+
+    order = sorted(range(len(starts)), key=starts.__getitem__)
+    alters = [(int(starts[idx]), int(ends[idx]), texts[idx]) for idx in order]
+    if any(not end > start for start, end, _ in alters):
+        raise ValueError("end should be larger than start!")
+    if alters[0][0] < 0 or max(end for _, end, _ in alters) > text_length:
+        raise IndexError("The given alteration is out of the text's bounds!")
+    if any(previous[1] > alter[0] for previous, alter in zip(alters, alters[1:])):
+        raise ValueError("The given alteration overlaps with an existing one!")
+    return alters
+
+
+def splice(source, alters):
+    """Replace the given slices of a string or bytes object and return the result.
+
+    The alterations must be `(start, end, replacement)` tuples that are sorted and do not overlap. The kept slices and
+    the replacements are collected and joined once, so applying k alterations to n characters is O(n + k).
+
+    >>> splice("This is the content.", [(0, 4, "That"), (12, 19, "text")])
+    'That is the text.'
+    """
+    pieces = []
+    cur = 0
+    for start, end, replacement in alters:
+        pieces += [source[cur:start], replacement]
+        cur = end
+    pieces.append(source[cur:])
+    return source[:0].join(pieces)
 
 
 def apply_buffer_to_text(buffer, text):
@@ -61,10 +242,39 @@ def apply_buffer_to_text(buffer, text):
 
     This replaces the original text at the indices specified in the alterations by the respective altered texts.
     """
-    new_text = ""
-    cur = 0
-    for start, end, alteration in buffer.sort():
-        new_text += text[cur:start] + alteration
-        cur = end
-    new_text += text[cur:]
-    return new_text
+    return splice(text, buffer.sort())
+
+
+def bom_encoding(bytes_):
+    """Return the encoding given by the byte order mark at the start of the bytes or `None` if there is none.
+
+    >>> bom_encoding(codecs.BOM_UTF16_LE + 'text'.encode('utf-16-le'))
+    'utf-16'
+    """
+    bom = detect_bom(bytes_)
+    return bom[0] if bom else None
+
+
+def detect_bom(bytes_):
+    """Return the `(encoding, codec, length)` of the byte order mark at the start of the bytes or `None` if there is none.
+
+    The encoding decodes the bytes including the byte order mark, the codec (with the byte order) the bytes after it.
+    Any bytes-like object can be passed, e.g. a memory view.
+
+    >>> detect_bom(codecs.BOM_UTF16_LE + 'text'.encode('utf-16-le'))
+    ('utf-16', 'utf-16-le', 2)
+    """
+    for bom, encoding, codec in _BOMS:
+        if bytes_[: len(bom)] == bom:
+            return encoding, codec, len(bom)
+    return None
+
+
+# UTF-32 first, as its little endian BOM starts with the one of UTF-16
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32", "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32", "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8-sig", "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16", "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16", "utf-16-be"),
+]
@@ -4,12 +4,21 @@ from ._utils import AlterationsBuffer
 
 
 class Format(ABC):
+    # whether alterations were applied since the file was loaded
+    dirty = False
+    # whether `load()` accepts any bytes-like object, like a memory map of the file, and `write()` streams the output
+    streaming = False
+    _bytes = None  # the cached `bytes`, reset when alterations are applied
+
     def __init__(self):
         self._buffer = AlterationsBuffer()
 
     @abstractmethod
     def load(self, bytes_):
-        """Load the file in binary format into the internal representation."""
+        """Load the file in binary format into the internal representation.
+
+        Implementations call `_mark_clean()` first, such that an instance can be loaded again.
+        """
         pass
 
     @property
@@ -18,10 +27,26 @@ class Format(ABC):
         """Get the current text content."""
         pass
 
+    def __getitem__(self, key):
+        """Get a substring of the text content using slicing or indexing."""
+        return self.text[key]
+
+    def __len__(self):
+        """Get the length of the text content."""
+        return len(self.text)
+
     @property
     @abstractmethod
     def bytes(self):
-        """Get the current file content as binary data."""
+        """Get the current file content as binary data.
+
+        Serializing the file can be expensive, so implementations cache the result in `_bytes` until the next call of
+        `apply_alters()`.
+        """
+
+    def write(self, f):
+        """Write the current file content to the binary file object `f`."""
+        f.write(self.bytes)
 
     def add_alter(self, start, end, new_text):
         """Queue an alteration of the text.
@@ -31,10 +56,28 @@ class Format(ABC):
         """
         self._buffer += (start, end, new_text)
 
+    def add_alters(self, alters):
+        """Queue many `(start, end, new_text)` alterations at once.
+
+        This behaves like calling `add_alter()` for each alteration but checks the overlaps in a single sweep.
+        """
+        self._buffer.add_many(alters)
+
     @abstractmethod
     def apply_alters(self):
         """Apply all queued alterations.
 
-        After calling this method, `text` and `bytes` will be updated.
+        After calling this method, `text` and `bytes` will be updated. Implementations call `_mark_dirty()` when done.
         """
         pass
+
+    def _mark_clean(self):
+        """Drop the cached `bytes` and the queued alterations of a previously loaded file."""
+        self._bytes = None
+        self.dirty = False
+        self._buffer.clear()
+
+    def _mark_dirty(self):
+        """Drop the cached `bytes` and remember that the file was altered."""
+        self._bytes = None
+        self.dirty = True
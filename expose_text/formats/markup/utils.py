@@ -1,60 +1,390 @@
 import html
 import re
-from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from itertools import accumulate, chain
+
+from expose_text.formats._utils import splice
 
 """Utils for markup languages with tags and elements like XML or HTML."""
 
+_TAG_PATTERN = re.compile(r"<[^>]*>")
+_ENTITY_PATTERN = re.compile(r"&(?:\w+|#\d+|#x[0-9a-fA-F]+);")
+
 
 class MarkupModifier:
-    """This class takes care of altering markup."""
+    """This class takes care of altering markup.
 
-    def __init__(self, markup, mapping):
+    The mapping and the tag index are kept as `BlockedArrays`, so applying alterations only rewrites the runs and tags of
+    the touched blocks and moves the following blocks by an offset.
+    """
+
+    def __init__(self, markup, mapping, tags=None):
         """
         :param markup:  a string containing content in a markup language
-        :param mapping: a mapping from the indices of the contained text to its positions in the markup,
+        :param mapping: an `IndexMapping` from the indices of the contained text to its positions in the markup,
             i.e. `mapping[text_idx] == markup_idx`
+        :param tags: the `(starts, ends)` arrays of the tags as `find_tags()` returns them, if they are already known
         """
         self._markup = markup
-        self._text_to_markup_idx = mapping
+        # the (text_start, markup_start) runs of the mapping
+        self._runs = BlockedArrays(mapping._text_starts, mapping._markup_starts)
+        self._text_len = len(mapping)
 
-    def apply_buffer(self, buffer):
-        new_markup = ""
-        cur = 0
-        for start, end, new_text in buffer.sort():
-            new_markup += self._markup[cur : self._text_to_markup_idx[start]] + html.escape(new_text)
+        # the sorted start and end offsets of all tags, used to find the tags an alteration spans over
+        self._tags = BlockedArrays(*(tags or find_tags(markup)))
 
-            # inner - 1: get the markup index of last text char, outer + 1: get the next char in markup
-            cur = self._text_to_markup_idx[end - 1] + 1
+    def apply_buffer(self, buffer):
+        """Apply the alterations of the text to the markup and update the mapping and tag index accordingly."""
+        markup_alters = []
+        # from right to left, so the indices of the alterations still to apply are not shifted
+        for start, end, new_text in buffer.sort(reverse=True):
+            markup_start = self._markup_idx(start)
+            markup_end = self._markup_char_end(self._markup_idx(end - 1))
+            escaped_text = html.escape(new_text)
 
             # append any markup tags that got skipped (in case end spanned further than the starting element)
-            new_markup += self._get_skipped_tags(self._text_to_markup_idx[start], cur)
-        new_markup += self._markup[cur:]
-        self._markup = new_markup
+            first_tag, last_tag = self._get_skipped_tags(markup_start, markup_end)
+            skipped_tags = [self._markup[self._tags.get(i, 0) : self._tags.get(i, 1)] for i in range(first_tag, last_tag)]
+            replacement = escaped_text + "\n".join(skipped_tags)
+            markup_alters.append((markup_start, markup_end, replacement))
+            text_shift = len(new_text) - (end - start)
+            markup_shift = len(replacement) - (markup_end - markup_start)
+
+            # only the runs of the altered text are new, the ones after it are moved
+            text_starts, markup_starts = [], []
+            if escaped_text == new_text and new_text:
+                text_starts.append(start)
+                markup_starts.append(markup_start)
+            else:
+                pos = markup_start
+                for idx, char in enumerate(new_text, start):
+                    text_starts.append(idx)
+                    markup_starts.append(pos)
+                    pos += len(html.escape(char))
+            lo = self._runs.bisect_right(0, start) - 1
+            if self._runs.get(lo, 0) < start:
+                lo += 1
+            hi = self._runs.bisect_left(0, end)
+            if end < self._text_len and (hi == len(self._runs) or self._runs.get(hi, 0) > end):
+                # the run of the text after the alteration starts within the altered text
+                text_starts.append(end + text_shift)
+                markup_starts.append(self._markup_idx(end) + markup_shift)
+            self._runs.replace(lo, hi, [text_starts, markup_starts], [text_shift, markup_shift])
+            self._text_len += text_shift
+
+            # the skipped tags are moved into the replacement
+            pos = markup_start + len(escaped_text)
+            tag_starts, tag_ends = [], []
+            for tag in skipped_tags:
+                tag_starts.append(pos)
+                tag_ends.append(pos + len(tag))
+                pos += len(tag) + 1
+            self._tags.replace(first_tag, last_tag, [tag_starts, tag_ends], [markup_shift, markup_shift])
+
+        self._markup = splice(self._markup, markup_alters[::-1])
         return self._markup
 
+    def _markup_idx(self, idx):
+        """Return the position in the markup of the text character at `idx`."""
+        run = self._runs.bisect_right(0, idx) - 1
+        return self._runs.get(run, 1) + idx - self._runs.get(run, 0)
+
+    def _markup_char_end(self, idx):
+        """Return the end of the markup that represents the text character at `idx`, e.g. of an entity or a tag."""
+        tag = self._tags.bisect_left(0, idx)
+        if tag < len(self._tags) and self._tags.get(tag, 0) == idx:
+            return self._tags.get(tag, 1)
+        m = _ENTITY_PATTERN.match(self._markup, idx)
+        return m.end() if m else idx + 1
+
     def _get_skipped_tags(self, start, end):
-        """Return all tags between start and end."""
-        pattern = re.compile(r"<[^>]*>")
-        tags = pattern.findall(self._markup[start:end])
-        return "\n".join(tags)
+        """Return the index range of all tags between start and end in the tag index."""
+        return self._tags.bisect_left(0, start), self._tags.bisect_right(1, end)
+
+
+def find_tags(markup, offset=0):
+    """Return the arrays of the start and end offsets of all tags in the markup, shifted by `offset`.
+
+    >>> find_tags("<p>A<br/></p>", 10)
+    (array('q', [10, 14, 19]), array('q', [13, 19, 23]))
+    """
+    starts = array("q")
+    ends = array("q")
+    for m in _TAG_PATTERN.finditer(markup):
+        starts.append(m.start() + offset)
+        ends.append(m.end() + offset)
+    return starts, ends
+
+
+class IndexMapping:
+    """A compact mapping from the indices of a text to their positions in the markup it was extracted from.
+
+    The mapping is stored as runs of consecutive text characters that map to consecutive markup positions. Its size
+    thus grows with the number of text runs and not with the length of the markup. Lookups bisect the runs.
+
+    >>> mapping = IndexMapping()
+    >>> mapping.append(3, length=2)
+    >>> mapping.append(10)
+    >>> mapping[0], mapping[1], mapping[2], len(mapping)
+    (3, 4, 10, 3)
+    """
+
+    def __init__(self):
+        self._text_starts = array("q")
+        self._markup_starts = array("q")
+        self._len = 0
+
+    @classmethod
+    def identity(cls, length):
+        """Return a mapping of `length` indices onto themselves."""
+        mapping = cls()
+        mapping.append(0, length)
+        return mapping
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._len
+        if not 0 <= idx < self._len:
+            raise IndexError("mapping index out of range")
+        run = bisect_right(self._text_starts, idx) - 1
+        return self._markup_starts[run] + idx - self._text_starts[run]
+
+    def __iter__(self):
+        for text_start, markup_start, length in self.runs():
+            yield from range(markup_start, markup_start + length)
+
+    def runs(self):
+        """Iterate over the `(text_start, markup_start, length)` runs of the mapping."""
+        for run, text_start in enumerate(self._text_starts):
+            text_end = self._text_starts[run + 1] if run + 1 < len(self._text_starts) else self._len
+            yield text_start, self._markup_starts[run], text_end - text_start
+
+    def append(self, markup_idx, length=1):
+        """Append `length` text indices that map to consecutive markup positions starting at `markup_idx`."""
+        if length <= 0:
+            return
+        if self._text_starts and self._markup_starts[-1] + self._len - self._text_starts[-1] == markup_idx:
+            self._len += length
+            return
+        self._text_starts.append(self._len)
+        self._markup_starts.append(markup_idx)
+        self._len += length
+
+    def extend(self, other, start, stop, shift=0):
+        """Append the mapping of the text indices from `start` to `stop` of another mapping, moved by `shift`."""
+        if start >= stop:
+            return
+        first = bisect_right(other._text_starts, start) - 1
+        last = bisect_left(other._text_starts, stop)
+
+        # the first run may be cut and merged with the last run of this mapping
+        first_end = other._text_starts[first + 1] if first + 1 < last else stop
+        self.append(other._markup_starts[first] + start - other._text_starts[first] + shift, first_end - start)
+
+        # the following runs are copied as they are, only the last one may be cut
+        if first + 1 < last:
+            text_shift = self._len - first_end
+            self._text_starts.extend(text_start + text_shift for text_start in other._text_starts[first + 1 : last])
+            self._markup_starts.extend(markup_start + shift for markup_start in other._markup_starts[first + 1 : last])
+            self._len += stop - first_end
+
+
+class BlockedArrays:
+    """Rows of sorted integer columns, stored in blocks that are each moved by an offset per column.
+
+    Replacing a range of rows and shifting all the following ones only rewrites the blocks of the replaced rows and
+    adds the shifts to the offsets of the following blocks. It thus costs O(block_size + number of blocks) and not
+    O(number of rows).
+
+    >>> rows = BlockedArrays(array("q", [0, 5, 9]), array("q", [0, 10, 20]))
+    >>> rows.replace(1, 2, [[5, 6], [10, 12]], [1, 3])
+    >>> [rows.get(idx, 0) for idx in range(len(rows))], [rows.get(idx, 1) for idx in range(len(rows))]
+    ([0, 5, 6, 10], [0, 10, 12, 23])
+    >>> rows.bisect_right(0, 6), rows.bisect_left(1, 23)
+    (3, 3)
+    """
+
+    block_size = 1024
 
+    def __init__(self, *columns):
+        """
+        :param columns: arrays of the same length whose values are sorted
+        """
+        self._ncols = len(columns)
+        self._blocks = []
+        self._offsets = []
+        for lo in range(0, len(columns[0]), self.block_size):
+            self._blocks.append([column[lo : lo + self.block_size] for column in columns])
+            self._offsets.append([0] * self._ncols)
+        self._update_starts()
+
+    def __len__(self):
+        return self._starts[-1]
+
+    def get(self, idx, col):
+        block = bisect_right(self._starts, idx) - 1
+        return self._blocks[block][col][idx - self._starts[block]] + self._offsets[block][col]
+
+    def bisect_left(self, col, value):
+        """Return the index of the first row whose value in `col` is not smaller than `value`."""
+        block = self._find_block(col, lambda last: last < value)
+        if block == len(self._blocks):
+            return len(self)
+        return self._starts[block] + bisect_left(self._blocks[block][col], value - self._offsets[block][col])
+
+    def bisect_right(self, col, value):
+        """Return the index of the first row whose value in `col` is larger than `value`."""
+        block = self._find_block(col, lambda last: last <= value)
+        if block == len(self._blocks):
+            return len(self)
+        return self._starts[block] + bisect_right(self._blocks[block][col], value - self._offsets[block][col])
+
+    def _find_block(self, col, before):
+        """Return the first block whose last value in `col` is not `before` the searched one."""
+        lo, hi = 0, len(self._blocks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if before(self._blocks[mid][col][-1] + self._offsets[mid][col]):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def replace(self, lo, hi, new_columns, shifts):
+        """Replace the rows from `lo` to `hi` with the new ones and add the `shifts` to the columns of the following rows.
+
+        :param new_columns: a sequence of the values of the new rows per column
+        :param shifts: the value to add to each column of the rows after `hi`
+        """
+        if not self._blocks:
+            self._blocks.append([array("q", []) for _ in range(self._ncols)])
+            self._offsets.append([0] * self._ncols)
+        first = min(bisect_right(self._starts, lo), len(self._blocks)) - 1
+        last = min(bisect_right(self._starts, hi), len(self._blocks)) - 1
+
+        # rebuild the touched blocks relative to the offsets of the first one
+        rebuilt = []
+        for col, new_values in enumerate(new_columns):
+            offset = self._offsets[first][col]
+            tail_shift = self._offsets[last][col] + shifts[col] - offset
+            tail = self._blocks[last][col][hi - self._starts[last] :]
+            if tail_shift:
+                tail = array("q", (value + tail_shift for value in tail))
+            head = self._blocks[first][col][: lo - self._starts[first]]
+            rebuilt.append(head + array("q", (value - offset for value in new_values)) + tail)
+
+        blocks = [
+            [column[pos : pos + self.block_size] for column in rebuilt] for pos in range(0, len(rebuilt[0]), self.block_size)
+        ]
+        self._blocks[first : last + 1] = blocks
+        self._offsets[first : last + 1] = [list(self._offsets[first]) for _ in blocks]
+        for offsets in self._offsets[first + len(blocks) :]:
+            for col, shift in enumerate(shifts):
+                offsets[col] += shift
+        self._update_starts()
+
+    def _update_starts(self):
+        self._starts = list(accumulate(chain((0,), (len(block[0]) for block in self._blocks))))
+
+
+class Rule(namedtuple("Rule", ["regex", "replace_with", "flags"])):
+    """A single removal rule: every match of `regex` in the text is replaced by `replace_with`."""
+
+    __slots__ = ()
+
+    def __new__(cls, regex, replace_with="", flags=0):
+        return super().__new__(cls, regex, replace_with, flags)
+
+
+class ExtractionProgram:
+    """A compiled list of rules that extracts the text and its index mapping from markup.
 
-class Mapper(ABC):
+    The rules are applied in order. Each rule is run as a left-to-right sweep over the current text that collects the
+    kept slices and joins them once, so a sweep is linear in the length of the text. A sweep is repeated until the rule
+    no longer matches, because a replacement can form a new match (e.g. `&amp;amp;`). This gives the same result as
+    searching again from the start after every single replacement.
+
+    >>> program = ExtractionProgram([Rule(r"<[^>]+>"), Rule(r"&amp;", replace_with="&")])
+    >>> text, mapping = program.run("<p>A &amp; B</p>")
+    >>> text, list(mapping)
+    ('A & B', [3, 4, 5, 10, 11])
+    """
+
+    def __init__(self, rules):
+        self._steps = [(re.compile(rule.regex, flags=rule.flags), rule.replace_with) for rule in rules]
+
+    def run(self, markup, mapping=None):
+        """Return the extracted text and a mapping from the indices of the text to their positions in `markup`.
+
+        :param markup: the markup to extract the text from
+        :param mapping: an optional initial `IndexMapping`, e.g. if `markup` has already been preprocessed
+        """
+        text = markup
+        if mapping is None:
+            mapping = IndexMapping.identity(len(markup))
+        for pattern, replace_with in self._steps:
+            text, mapping = sweep(pattern, replace_with, text, mapping)
+        return text, mapping
+
+
+def sweep(pattern, replace_with, text, mapping):
+    """Replace all matches of the compiled `pattern` in `text` and update the index mapping accordingly.
+
+    Replacement characters keep the mapping of the first characters of the match they replace.
+    """
+    while True:
+        pieces = []
+        new_mapping = IndexMapping()
+        cur = 0
+        for m in pattern.finditer(text):
+            start, end = m.span()
+            if start == end:
+                continue
+            if len(replace_with) > end - start:
+                raise ValueError("The replacement must not be longer than the match!")
+
+            pieces += [text[cur:start], replace_with]
+            new_mapping.extend(mapping, cur, start + len(replace_with))
+            cur = end
+
+        if not pieces:
+            return text, mapping
+
+        pieces.append(text[cur:])
+        new_mapping.extend(mapping, cur, len(text))
+        text, mapping = "".join(pieces), new_mapping
+
+
+class Mapper:
     """This is the base for language specific classes that map markup to text and create an index mapping.
 
-    Initially `self._text` contains the markup which is then step by step removed by calls to `_remove_pattern` in
-    `get_text_and_mapping`. While removing it an index mapping is maintained that maps each index in `self._text` to its
-    position in the markup.
+    Subclasses declare their extraction as an ordered list of `rules`. The rules are compiled once per class into an
+    `ExtractionProgram`, which removes the markup from the text while maintaining a mapping from each index in the text
+    to its position in the markup.
     """
 
+    rules = []
+
     def __init__(self, markup):
         self._text = markup
         self._markup = markup
-        self._text_to_markup_idx = list(range(len(markup)))
+        self._text_to_markup_idx = IndexMapping.identity(len(markup))
+
+    @classmethod
+    def program(cls):
+        """Return the compiled program for the rules of this class."""
+        if "_program" not in cls.__dict__:
+            cls._program = ExtractionProgram(cls.rules)
+        return cls._program
 
-    @abstractmethod
     def simultaneous_text_extraction_and_mapping(self):
-        """Extract the text and create an index mapping by one or more calls to `remove_patterns`."""
+        """Extract the text and create an index mapping by running the compiled rules."""
+        self._text, self._text_to_markup_idx = self.program().run(self._text, self._text_to_markup_idx)
         return self._text, self._text_to_markup_idx
 
     def _remove_pattern(self, regex, replace_with="", flags=0):
@@ -65,15 +395,4 @@ class Mapper(ABC):
         :param flags: optional re compile flags
         """
         pattern = re.compile(regex, flags=flags)
-        while True:
-            m = re.search(pattern, self._text)
-            if m is None:
-                break
-
-            self._replace_content_in_markup(m.start(0), m.end(0), replace_with)
-
-    def _replace_content_in_markup(self, start, end, new_text):
-        if len(new_text) > end - start:
-            raise ValueError()
-        self._text = self._text[:start] + new_text + self._text[end:]
-        del self._text_to_markup_idx[start + len(new_text) : end]
+        self._text, self._text_to_markup_idx = sweep(pattern, replace_with, self._text, self._text_to_markup_idx)
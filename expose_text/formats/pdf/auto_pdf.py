@@ -31,12 +31,22 @@ class AutoPdfFormat(Format):
     def text(self):
         return self.format.text
 
+    def __getitem__(self, key):
+        return self.format[key]
+
     @property
     def bytes(self):
         return self.format.bytes
 
+    @property
+    def dirty(self):
+        return self.format.dirty
+
     def add_alter(self, start, end, new_text):
         self.format.add_alter(start, end, new_text)
 
+    def add_alters(self, alters):
+        self.format.add_alters(alters)
+
     def apply_alters(self):
         self.format.apply_alters()
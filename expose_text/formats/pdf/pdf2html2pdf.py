@@ -59,6 +59,7 @@ class Pdf2Html2PdfFormat(Format):
         self.wkhtmltopdf_path = wkhtmltopdf_path
 
     def load(self, bytes_):
+        self._mark_clean()
         self.page2html = self.get_html_pages_from_pdf(bytes_)
 
         # send to html format wrapper
@@ -82,6 +83,9 @@ class Pdf2Html2PdfFormat(Format):
     @property
     def bytes(self):
         """Generate PDF from HTML bytes with pdfkit (wkhtmltopdf) """
+        if self._bytes is not None:
+            return self._bytes
+
         html_bytes = self.html_format.bytes
 
         pdf_bytes = pdfkit.from_string(
@@ -99,15 +103,23 @@ class Pdf2Html2PdfFormat(Format):
             },
         )
 
+        self._bytes = pdf_bytes
         return pdf_bytes
 
     def add_alter(self, start, end, new_text):
         """Alter only on HTML format"""
         self.html_format.add_alter(start, end, new_text)
 
+    def add_alters(self, alters):
+        """Alter only on HTML format"""
+        self.html_format.add_alters(alters)
+
     def apply_alters(self):
         """Alter only on HTML format"""
+        if len(self.html_format._buffer) == 0:
+            return  # nothing to apply, keep the cached bytes
         self.html_format.apply_alters()
+        self._mark_dirty()
 
     def get_html_pages_from_pdf(self, pdf_bytes) -> Dict[int, str]:
         """
@@ -327,10 +327,201 @@ def tokenize_streams(streams):
             yield token
 
 
-def build_text_layer(document, options):
+def build_text_layer(document, options, max_workers=None):
+    # Build the text layer of all pages, see build_page_text_layer. If max_workers
+    # is given, the pages are tokenized on a process pool, see build_page_text_layers.
+    text_tokens = []
+    page_tokens = []
+    fontcache = {}
+    page_numbers = range(len(document.pages))
+    for page_text_tokens, token_list in build_page_text_layers(document.pages, page_numbers, fontcache, options, max_workers):
+        text_tokens.extend(page_text_tokens)
+        page_tokens.append(token_list)
+
+    return (text_tokens, page_tokens)
+
+
+def build_page_text_layers(pages, page_numbers, fontcache, options, max_workers=None):
+    # Build the text layers of the given pages, in the order of page_numbers.
+    #
+    # Without max_workers the pages are built one after another by build_page_text_layer.
+    # Otherwise they are tokenized on a process pool. pdfrw's font objects point into
+    # the document and can't be sent to another process, so each worker gets the
+    # uncompressed content streams of a page as bytes and the fonts of the page's
+    # resources reduced to what toUnicode looks at. The workers return the tokens with
+    # font names in place of fonts, which are resolved against the page's fonts again
+    # here, and the characters they have seen in each font, which are merged into the
+    # fontcache. The fontcache ends up with the same entries as with the serial path.
+    from concurrent.futures import ProcessPoolExecutor
+
+    if max_workers is None or len(page_numbers) < 2:
+        return [build_page_text_layer(pages[n], n, fontcache, options) for n in page_numbers]
+
+    page_fonts = [resolve_page_fonts(pages[n]) for n in page_numbers]
+    streams = [page_content_bytes(pages[n]) for n in page_numbers]
+    font_infos = [describe_fonts(fonts, fontcache) for fonts in page_fonts]
+
+    layers = []
+    with ProcessPoolExecutor(max_workers) as executor:
+        results = executor.map(tokenize_page_bytes, page_numbers, streams, font_infos)
+        for fonts, (text_tokens, token_list, chars_by_font) in zip(page_fonts, results):
+            for token in iter_text_tokens(token_list):
+                token.font = fonts.get(token.font) if token.font else None
+                token.fontcache = fontcache
+                token.options = options
+            for base_font, chars in chars_by_font.items():
+                fontcache.setdefault(base_font, set()).update(chars)
+            layers.append((text_tokens, token_list))
+
+    return layers
+
+
+def resolve_page_fonts(page):
+    # Map the font names of a page to the fonts of its resource dictionary and
+    # the ones above it, the way the Tf operator looks them up.
+    fonts = {}
+    resources = page.Resources
+    while resources:
+        for name, font in (resources.Font or {}).items():
+            if font:
+                fonts.setdefault(name, font)
+        resources = resources.Parent
+    return fonts
+
+
+def page_content_bytes(page):
+    # Return the uncompressed content streams of a page as bytes.
+    if page.Contents is None:
+        return []
+    return [content.stream.encode("latin-1") for content in uncompressed_page_contents(page)]
+
+
+def describe_fonts(fonts, fontcache):
+    # Reduce the fonts of a page to picklable (BaseFont, Encoding, ToUnicode stream)
+    # tuples for tokenize_page_bytes. The CMaps are added to the fontcache here, as
+    # fromUnicode needs them when the altered text is encoded.
+    from pdfrw.uncompress import uncompress as uncompress_streams
+    from pdfrw.objects.pdfname import BasePdfName
+
+    infos = {}
+    for name, font in fonts.items():
+        to_unicode = None
+        if font.ToUnicode:
+            uncompress_streams([font.ToUnicode])
+            to_unicode = font.ToUnicode.stream
+            if to_unicode not in fontcache:
+                fontcache[to_unicode] = CMap(font.ToUnicode)
+        encoding = font.Encoding if isinstance(font.Encoding, BasePdfName) else None
+        infos[name] = (font.BaseFont, encoding, to_unicode)
+    return infos
+
+
+def tokenize_page_bytes(page_number, streams, font_infos):
+    # Build the text layer of a page in a worker process, see build_page_text_layers.
+    #
+    # Returns the text tokens, all tokens and the characters seen in each font. The
+    # tokens hold the name of their font instead of the font.
+    from pdfrw import PdfName
+
+    fonts = {
+        name: PdfDict(
+            Type=PdfName.Font,
+            BaseFont=base_font,
+            Encoding=encoding,
+            ToUnicode=PdfDict(stream=to_unicode) if to_unicode else None,
+        )
+        for name, (base_font, encoding, to_unicode) in font_infos.items()
+    }
+    fontcache = {}
+    text_tokens, token_list = tokenize_page_text(
+        (stream.decode("latin-1") for stream in streams), fonts.get, page_number, fontcache, None
+    )
+
+    names = {id(font): name for name, font in fonts.items()}
+    for token in iter_text_tokens(token_list):
+        token.font = names.get(id(token.font))
+        token.fontcache = None
+    chars_by_font = {key: chars for key, chars in fontcache.items() if isinstance(chars, set)}
+    return (text_tokens, token_list, chars_by_font)
+
+
+def iter_text_tokens(token_list):
+    # Yield the TextTokens of a page's token list. Strings are only turned into
+    # TextTokens at the top level and within TJ arrays.
+    from pdfrw import PdfArray
+
+    for token in token_list:
+        if isinstance(token, TextToken):
+            yield token
+        elif isinstance(token, PdfArray):
+            for item in token:
+                if isinstance(item, TextToken):
+                    yield item
+
+
+def page_contents(page):
+    # The page may have one content stream or an array of content streams.
+    # If an array, they are treated as if they are concatenated into a single
+    # stream (per the spec).
+    from pdfrw import PdfArray
+
+    if isinstance(page.Contents, PdfArray):
+        return list(page.Contents)
+    return [page.Contents]
+
+
+def uncompressed_page_contents(page):
+    # Return the content streams of a page with any compression Filter
+    # un-applied. Compressed streams are uncompressed as copies: the original
+    # stream objects may be shared by other pages and are kept as they are
+    # on pages whose text isn't changed.
+    from pdfrw.uncompress import uncompress as uncompress_streams
+
+    contents = []
+    for content in page_contents(page):
+        if isinstance(content, PdfDict) and content.Filter:
+            content = PdfDict(Filter=content.Filter, DecodeParms=content.DecodeParms, DP=content.DP, stream=content.stream)
+        contents.append(content)
+    # If an unrecognized filter is present, a warning is logged and the stream
+    # is left compressed. uncompress_streams expects an array of streams.
+    uncompress_streams(contents)
+    return contents
+
+
+class TextToken:
+    value = None
+    font = None
+    page = None
+
+    def __init__(self, value, font, fontcache, options):
+        self.font = font
+        self.fontcache = fontcache
+        self.options = options
+        self.raw_original_value = value
+        self.original_value = toUnicode(value, font, fontcache)
+        self.value = self.original_value
+
+    def __str__(self):
+        from pdfrw import PdfString
+
+        # __str__ is used for serialization
+        if self.value == self.original_value:
+            # If unchanged, return the raw original value without decoding/encoding.
+            return PdfString.from_bytes(self.raw_original_value)
+        else:
+            # If the value changed, encode it from Unicode according to the encoding
+            # of the font that is active at the location of this token.
+            return PdfString.from_bytes(fromUnicode(self.value, self.font, self.fontcache, self.options))
+
+    def __repr__(self):
+        # __repr__ is used for debugging
+        return "Token<%s>" % repr(self.value)
+
+
+def build_page_text_layer(page, page_number, fontcache, options):
     # Within each page's content stream, look for text-showing operators to
     # find the text content of the page. Construct a string that contains the
-    # entire text content of the document AND a mapping from characters in the
+    # entire text content of the page AND a mapping from characters in the
     # text content to tokens in the content streams. That lets us modify the
     # tokens in the content streams when we find text that we want to redact.
     #
@@ -364,123 +555,103 @@ def build_text_layer(document, options):
     #
     # To know the active font, we look for the "<font> <size> Tf" operator.
 
-    from pdfrw import PdfObject, PdfString, PdfArray
-    from pdfrw.uncompress import uncompress as uncompress_streams
-    from pdfrw.objects.pdfname import BasePdfName
+    #
+    # The fontcache is shared by the pages of a document. It collects the characters
+    # seen in each font, so it only knows the pages that were processed so far.
+    #
+    # Returns the text tokens of the page and its revised list of all tokens.
 
-    text_tokens = []
-    fontcache = {}
+    if page.Contents is None:
+        return ([], [])
 
-    class TextToken:
-        value = None
+    # If a compression Filter is applied, attempt to un-apply it.
+    contents = uncompressed_page_contents(page)
+
+    def resolve_font(name):
+        # The name must be looked up in the content stream's resource dictionary,
+        # which is page.Resources, plus any resource dictionaries above it in the
+        # document hierarchy.
         font = None
+        resources = page.Resources
+        while resources and not font:
+            font = resources.Font[name]
+            resources = resources.Parent
+        return font
 
-        def __init__(self, value, font):
-            self.font = font
-            self.raw_original_value = value
-            self.original_value = toUnicode(value, font, fontcache)
-            self.value = self.original_value
-
-        def __str__(self):
-            # __str__ is used for serialization
-            if self.value == self.original_value:
-                # If unchanged, return the raw original value without decoding/encoding.
-                return PdfString.from_bytes(self.raw_original_value)
-            else:
-                # If the value changed, encode it from Unicode according to the encoding
-                # of the font that is active at the location of this token.
-                return PdfString.from_bytes(fromUnicode(self.value, self.font, fontcache, options))
+    return tokenize_page_text((content.stream for content in contents), resolve_font, page_number, fontcache, options)
+
+
+def tokenize_page_text(streams, resolve_font, page_number, fontcache, options):
+    # Tokenize the uncompressed content streams of a page, see build_page_text_layer.
+    # resolve_font looks up the font of a font name used by the Tf operator.
 
-        def __repr__(self):
-            # __repr__ is used for debugging
-            return "Token<%s>" % repr(self.value)
+    from pdfrw import PdfObject, PdfString, PdfArray
+    from pdfrw.objects.pdfname import BasePdfName
+
+    text_tokens = []
 
     def process_text(token):
         if token.value == "":
             return
+        # Remember the page the token is shown on.
+        token.page = page_number
         text_tokens.append(token)
 
-    # For each page...
-    page_tokens = []
-    for page in document.pages:
-        # For each token in the content stream...
-
-        # Remember this page's revised token list.
-        token_list = []
-        page_tokens.append(token_list)
-
-        if page.Contents is None:
-            continue
-
-        prev_token = None
-        prev_prev_token = None
-        current_font = None
-
-        # The page may have one content stream or an array of content streams.
-        # If an array, they are treated as if they are concatenated into a single
-        # stream (per the spec).
-        if isinstance(page.Contents, PdfArray):
-            contents = list(page.Contents)
-        else:
-            contents = [page.Contents]
-
-        # If a compression Filter is applied, attempt to un-apply it. If an unrecognized
-        # filter is present, an error is raised. uncompress_streams expects an array of
-        # streams.
-        uncompress_streams(contents)
-
-        def make_mutable_string_token(token):
-            if isinstance(token, PdfString):
-                token = TextToken(token.to_bytes(), current_font)
-
-                # Remember all unicode characters seen in this font so we can
-                # avoid inserting characters that the PDF isn't likely to have
-                # a glyph for.
-                if current_font and current_font.BaseFont:
-                    fontcache.setdefault(current_font.BaseFont, set()).update(token.value)
-            return token
-
-        # Iterate through the tokens in the page's content streams.
-        for token in tokenize_streams(content.stream for content in contents):
-            # Replace any string token with our own class that hold a mutable
-            # value, which is how we'll rewrite content.
-            token = make_mutable_string_token(token)
-
-            # Append the token into a new list that holds all tokens.
-            token_list.append(token)
-
-            # If the token is an operator and we're not inside an array...
-            if isinstance(token, PdfObject):
-                # And it's one that we recognize, process it.
-                if token in ("Tj", "'", '"') and isinstance(prev_token, TextToken):
-                    # Simple text operators.
-                    process_text(prev_token)
-                elif token == "TJ" and isinstance(prev_token, PdfArray):
-                    # The text array operator.
-                    for i in range(len(prev_token)):
-                        # (item may not be a string! only the strings are text.)
-                        prev_token[i] = make_mutable_string_token(prev_token[i])
-                        if isinstance(prev_token[i], TextToken):
-                            process_text(prev_token[i])
-
-                elif token == "Tf" and isinstance(prev_prev_token, BasePdfName):
-                    # Update the current font.
-                    # prev_prev_token holds the font 'name'. The name must be looked up
-                    # in the content stream's resource dictionary, which is page.Resources,
-                    # plus any resource dictionaries above it in the document hierarchy.
-                    current_font = None
-                    resources = page.Resources
-                    while resources and not current_font:
-                        current_font = resources.Font[prev_prev_token]
-                        resources = resources.Parent
-
-            # Remember the previously seen token in case the next operator is a text-showing
-            # operator -- in which case this was the operand. Remember the token before that
-            # because it may be a font name for the Tf operator.
-            prev_prev_token = prev_token
-            prev_token = token
-
-    return (text_tokens, page_tokens)
+    # For each token in the content stream...
+
+    # Remember this page's revised token list.
+    token_list = []
+
+    prev_token = None
+    prev_prev_token = None
+    current_font = None
+
+    def make_mutable_string_token(token):
+        if isinstance(token, PdfString):
+            token = TextToken(token.to_bytes(), current_font, fontcache, options)
+
+            # Remember all unicode characters seen in this font so we can
+            # avoid inserting characters that the PDF isn't likely to have
+            # a glyph for.
+            if current_font and current_font.BaseFont:
+                fontcache.setdefault(current_font.BaseFont, set()).update(token.value)
+        return token
+
+    # Iterate through the tokens in the page's content streams.
+    for token in tokenize_streams(streams):
+        # Replace any string token with our own class that hold a mutable
+        # value, which is how we'll rewrite content.
+        token = make_mutable_string_token(token)
+
+        # Append the token into a new list that holds all tokens.
+        token_list.append(token)
+
+        # If the token is an operator and we're not inside an array...
+        if isinstance(token, PdfObject):
+            # And it's one that we recognize, process it.
+            if token in ("Tj", "'", '"') and isinstance(prev_token, TextToken):
+                # Simple text operators.
+                process_text(prev_token)
+            elif token == "TJ" and isinstance(prev_token, PdfArray):
+                # The text array operator.
+                for i in range(len(prev_token)):
+                    # (item may not be a string! only the strings are text.)
+                    prev_token[i] = make_mutable_string_token(prev_token[i])
+                    if isinstance(prev_token[i], TextToken):
+                        process_text(prev_token[i])
+
+            elif token == "Tf" and isinstance(prev_prev_token, BasePdfName):
+                # Update the current font.
+                # prev_prev_token holds the font 'name'.
+                current_font = resolve_font(prev_prev_token)
+
+        # Remember the previously seen token in case the next operator is a text-showing
+        # operator -- in which case this was the operand. Remember the token before that
+        # because it may be a font name for the Tf operator.
+        prev_prev_token = prev_token
+        prev_token = token
+
+    return (text_tokens, token_list)
 
 
 def chunk_pairs(s):
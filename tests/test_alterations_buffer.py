@@ -1,6 +1,9 @@
+import random
+
 import pytest
 
-from expose_text.formats._utils import AlterationsBuffer
+from expose_text.formats import _utils
+from expose_text.formats._utils import AlterationsBuffer, BatchedAlterations, sorted_alters, splice
 
 
 @pytest.fixture()
@@ -40,3 +43,84 @@ def test_sorting(buffer):
     buffer.add(10, 15, "kenobi")
     buffer.sort()
     assert list(buffer) == [(0, 5, "yoda"), (10, 15, "kenobi"), (20, 25, "jarjar")]
+
+
+def test_enclosing_alterations(buffer):
+    buffer.add(5, 15, "han")
+
+    with pytest.raises(ValueError):
+        buffer.add(0, 20, "solo")
+
+    with pytest.raises(ValueError):
+        buffer.add(7, 10, "chewie")
+
+
+def test_add_many(buffer):
+    buffer.add(10, 15, "kenobi")
+    buffer.add_many([(20, 25, "jarjar"), (0, 5, "yoda")])
+    assert list(buffer) == [(0, 5, "yoda"), (10, 15, "kenobi"), (20, 25, "jarjar")]
+
+
+def test_add_many_overlapping(buffer):
+    buffer.add(10, 15, "kenobi")
+
+    with pytest.raises(ValueError):
+        buffer.add_many([(0, 5, "yoda"), (3, 8, "rey")])
+
+    with pytest.raises(ValueError):
+        buffer.add_many([(0, 5, "yoda"), (14, 16, "rey")])
+
+    assert list(buffer) == [(10, 15, "kenobi")]
+
+
+def test_reverse_sorting(buffer):
+    buffer.add(0, 5, "yoda")
+    buffer.add(10, 15, "kenobi")
+    assert list(buffer.sort(reverse=True)) == [(10, 15, "kenobi"), (0, 5, "yoda")]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def vectorization(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(_utils, "np", None)
+    elif _utils.np is None:
+        pytest.skip("numpy is not installed")
+
+
+def test_sorted_alters(vectorization):
+    alters = sorted_alters((20, 0, 10), (25, 5, 15), ("jarjar", "yoda", "kenobi"), 25)
+    assert alters == [(0, 5, "yoda"), (10, 15, "kenobi"), (20, 25, "jarjar")]
+    assert all(type(start) is int and type(end) is int for start, end, _ in alters)
+
+
+@pytest.mark.parametrize(
+    "starts, ends, error",
+    [((0, 3), (5, 8), ValueError), ((5,), (5,), ValueError), ((-1,), (5,), IndexError), ((20,), (26,), IndexError)],
+)
+def test_sorted_alters_invalid(vectorization, starts, ends, error):
+    with pytest.raises(error):
+        sorted_alters(starts, ends, ["luke"] * len(starts), 25)
+
+
+def test_batched_alterations():
+    batch = BatchedAlterations()
+    batch.add(20, 25, "jarjar")  # shifts everything after it by one
+    batch.add(0, 5, "yoda")  # shifts everything after it by minus one
+    batch.add(19, 21, "binks ")  # overlaps the start of the first alteration
+    batch.add(30, 31, "!")
+    assert list(batch) == [(0, 5, "yoda"), (20, 25, "binks rjar"), (26, 27, "!")]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_batched_alterations_match_sequential_edits(seed):
+    rng = random.Random(seed)
+    text = expected = "".join(rng.choice("abc") for _ in range(200))
+    batch = BatchedAlterations()
+    for _ in range(50):
+        start = rng.randrange(len(expected))
+        end = min(len(expected), start + rng.randint(1, 5))
+        new_text = "X" * rng.randint(0, 4)
+        batch.add(start, end, new_text)
+        expected = expected[:start] + new_text + expected[end:]
+
+    assert splice(text, list(batch)) == expected
@@ -1,6 +1,6 @@
 import pytest
 
-from expose_text.formats._utils import apply_buffer_to_text, AlterationsBuffer
+from expose_text.formats._utils import apply_buffer_to_text, AlterationsBuffer, splice
 
 
 @pytest.fixture
@@ -23,3 +23,14 @@ def test_remove_text(buffer, text):
     buffer.add(35, 59, " ")
     altered_text = apply_buffer_to_text(buffer, text)
     assert altered_text == "This is the content of a text file. Try alter me."
+
+
+def test_multiple_alterations(buffer, text):
+    buffer.add(63, 68, "change")
+    buffer.add(0, 4, "That")
+    altered_text = apply_buffer_to_text(buffer, text)
+    assert altered_text == "That is the content of a text file.\n\nWith multiple lines.\n\nTry change me."
+
+
+def test_splice_bytes():
+    assert splice(b"This is it.", [(0, 4, b"That"), (8, 10, b"")]) == b"That is ."
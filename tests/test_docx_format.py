@@ -1,9 +1,12 @@
 import filecmp
+import io
+import zipfile
 
 import pytest
+from defusedxml.common import EntitiesForbidden
 
 from expose_text import FileWrapper
-from expose_text.formats._docx import DocxFormat
+from expose_text.formats._docx import DocxFormat, DocxMapper
 
 ENCODING = "UTF-8"
 
@@ -94,3 +97,231 @@ This is the replaced line.
 """
     )
     assert filecmp.cmp(altered_file_path, tmp_out_path, shallow=False)
+
+
+def test_multiple_rounds_of_alterations(format_cls, docx_text, replace):
+    expected_text = docx_text
+    for args in [(7, 23, "XXX"), (13, 49, "<Y>"), (0, 5, "Heading")]:
+        format_cls.add_alter(*args)
+        format_cls.apply_alters()
+        expected_text = replace(expected_text, *args)
+        assert format_cls.text == expected_text
+
+    format_again = DocxFormat()
+    format_again.load(format_cls.bytes)
+    assert format_again.text == expected_text
+
+
+def test_unchanged_members_are_copied(docx_bytes, format_cls):
+    format_cls.add_alter(7, 23, "XXX")
+    format_cls.apply_alters()
+
+    original = zipfile.ZipFile(io.BytesIO(docx_bytes))
+    altered = zipfile.ZipFile(io.BytesIO(format_cls.bytes))
+    assert altered.testzip() is None
+    assert format_cls.bytes == format_cls.bytes
+    for zinfo in original.infolist():
+        if zinfo.filename == "word/document.xml":
+            continue
+        altered_zinfo = altered.getinfo(zinfo.filename)
+        assert (altered_zinfo.CRC, altered_zinfo.compress_size) == (zinfo.CRC, zinfo.compress_size)
+        assert altered.read(zinfo.filename) == original.read(zinfo.filename)
+
+
+class UnseekableBytesIO(io.BytesIO):
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise OSError
+
+    def tell(self):
+        raise OSError
+
+
+def test_data_descriptor_members_are_copied(docx_bytes):
+    # zipfile writes a data descriptor after each member when the output can't be seeked
+    bytes_io = UnseekableBytesIO()
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as zin, zipfile.ZipFile(bytes_io, "w") as zout:
+        for zinfo in zin.infolist():
+            zout.writestr(zinfo.filename, zin.read(zinfo), zipfile.ZIP_DEFLATED)
+    streamed_bytes = bytes_io.getvalue()
+    original = zipfile.ZipFile(io.BytesIO(streamed_bytes))
+    assert all(zinfo.flag_bits & 0x08 for zinfo in original.infolist())
+
+    format_cls = DocxFormat()
+    format_cls.load(streamed_bytes)
+    format_cls.add_alter(7, 23, "XXX")
+    format_cls.apply_alters()
+
+    altered = zipfile.ZipFile(io.BytesIO(format_cls.bytes))
+    assert altered.testzip() is None
+    for zinfo in original.infolist():
+        altered_zinfo = altered.getinfo(zinfo.filename)
+        if zinfo.filename != "word/document.xml":
+            assert (altered_zinfo.flag_bits, altered_zinfo.CRC) == (zinfo.flag_bits, zinfo.CRC)
+            assert altered.read(zinfo.filename) == original.read(zinfo.filename)
+
+    reloaded = DocxFormat()
+    reloaded.load(format_cls.bytes)
+    assert reloaded.text == format_cls.text
+    assert reloaded.text.startswith("Title\n\nXXX")
+
+
+def replace_document_xml(docx_bytes, document_xml):
+    return replace_members(docx_bytes, {"word/document.xml": document_xml})
+
+
+def replace_members(docx_bytes, members):
+    bytes_io = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(docx_bytes)) as zin, zipfile.ZipFile(bytes_io, "w") as zout:
+        for zinfo in zin.infolist():
+            zout.writestr(zinfo, members.get(zinfo.filename, zin.read(zinfo)))
+    return bytes_io.getvalue()
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-16", "windows-1252"])
+def test_document_xml_encodings(docx_bytes, encoding):
+    document_xml = zipfile.ZipFile(io.BytesIO(docx_bytes)).read("word/document.xml").decode("utf-8")
+    document_xml = document_xml.replace('encoding="UTF-8"', f'encoding="{encoding}"').replace("Title", "Titlé")
+    format_cls = DocxFormat()
+    format_cls.load(replace_document_xml(docx_bytes, document_xml.encode(encoding)))
+    assert format_cls.text.startswith("Titlé\n")
+
+    format_cls.add_alter(0, 5, "Títel")
+    format_cls.apply_alters()
+    format_again = DocxFormat()
+    format_again.load(format_cls.bytes)
+    assert format_again.text.startswith("Títel\n")
+
+
+def test_entities_are_forbidden(docx_bytes):
+    document_xml = b'<?xml version="1.0"?><!DOCTYPE w [<!ENTITY a "aaaaaaaaaa">]><w:t>&a;</w:t>'
+    with pytest.raises(EntitiesForbidden):
+        DocxFormat().load(replace_document_xml(docx_bytes, document_xml))
+
+
+def test_mapper():
+    document_xml = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<w:document xmlns:w="w"><w:body><w:p/>'
+        "<w:p><w:r><w:t>Fish &amp; </w:t></w:r><w:r><w:t>chips</w:t><w:br/><w:t>\n€5</w:t></w:r></w:p><w:p/>"
+        "<w:p><w:r><w:t>Thanks</w:t></w:r></w:p><w:sectPr/></w:body></w:document>"
+    )
+    text, mapping = DocxMapper(document_xml).simultaneous_text_extraction_and_mapping()
+    assert text == "Fish & chips\n€5\nThanks"
+    assert [document_xml[mapping[idx]] for idx in range(len(text))] == list("Fish & chips<€5<Thanks")
+
+
+@pytest.fixture
+def parts_docx_bytes(docx_bytes):
+    def part_xml(root, text):
+        return f'<?xml version="1.0" encoding="UTF-8"?><{root} xmlns:w="w"><w:p><w:r><w:t>{text}</w:t></w:r></w:p></{root}>'
+
+    return replace_members(
+        docx_bytes,
+        {
+            "word/header1.xml": part_xml("w:hdr", "Confidential"),
+            "word/footer1.xml": part_xml("w:ftr", "Page 1 of Jane Doe"),
+        },
+    )
+
+
+def test_text_parts(parts_docx_bytes, docx_text):
+    format_cls = DocxFormat()
+    format_cls.load(parts_docx_bytes)
+    assert format_cls.text == docx_text + "\n\nConfidential\n\nPage 1 of Jane Doe"
+
+    document_end = len(docx_text)
+    assert format_cls.part_spans == [
+        ("word/document.xml", 0, document_end),
+        ("word/header1.xml", document_end + 2, document_end + 14),
+        ("word/footer1.xml", document_end + 16, document_end + 34),
+    ]
+
+
+def test_text_parts_on_process_pool(parts_docx_bytes, monkeypatch):
+    sequential = DocxFormat()
+    sequential.load(parts_docx_bytes)
+
+    monkeypatch.setattr(DocxFormat, "max_workers", 2)
+    concurrent = DocxFormat()
+    concurrent.load(parts_docx_bytes)
+    assert concurrent.text == sequential.text
+    assert concurrent.part_spans == sequential.part_spans
+
+
+def test_altering_text_parts(parts_docx_bytes, docx_text):
+    format_cls = DocxFormat()
+    format_cls.load(parts_docx_bytes)
+    footer_start = format_cls.part_spans[2][1]
+    format_cls.add_alter(footer_start + 10, footer_start + 18, "XXX")
+    format_cls.add_alter(len(docx_text) - 6, len(docx_text) + 6, "YYY")  # spans the document and the header
+    format_cls.apply_alters()
+    expected_text = docx_text[:-6] + "YYY\n\nidential\n\nPage 1 of XXX"
+    assert format_cls.text == expected_text
+
+    format_again = DocxFormat()
+    format_again.load(format_cls.bytes)
+    assert format_again.text == expected_text
+
+
+def test_alteration_starting_in_separator(parts_docx_bytes, docx_text):
+    format_cls = DocxFormat()
+    format_cls.load(parts_docx_bytes)
+    header_start = format_cls.part_spans[1][1]
+    format_cls.add_alter(header_start - 2, header_start + 4, "X")  # starts on the first character of the separator
+    format_cls.apply_alters()
+    assert format_cls.text == docx_text + "\n\nXidential\n\nPage 1 of Jane Doe"
+
+    format_cls.add_alter(header_start - 1, header_start + 1, "Y")  # starts on the second character of the separator
+    format_cls.apply_alters()
+    assert format_cls.text == docx_text + "\n\nYidential\n\nPage 1 of Jane Doe"
+
+
+def test_alterations_of_only_a_separator_are_dropped(parts_docx_bytes, docx_text):
+    format_cls = DocxFormat()
+    format_cls.load(parts_docx_bytes)
+    header_start = format_cls.part_spans[1][1]
+    format_cls.add_alter(header_start - 2, header_start - 1, "x")
+    format_cls.add_alter(header_start - 1, header_start, "y")
+    format_cls.apply_alters()
+    assert format_cls.text == docx_text + "\n\nConfidential\n\nPage 1 of Jane Doe"
+
+    format_cls.add_alter(header_start, header_start + 4, "Conf")
+    format_cls.apply_alters()
+    assert format_cls.text == docx_text + "\n\nConfidential\n\nPage 1 of Jane Doe"
+
+
+def test_emptied_part_keeps_its_span(parts_docx_bytes, docx_text):
+    format_cls = DocxFormat()
+    format_cls.load(parts_docx_bytes)
+    _, header_start, header_end = format_cls.part_spans[1]
+    format_cls.add_alter(header_start, header_end, "")
+    format_cls.apply_alters()
+    assert format_cls.text == docx_text + "\n\n\n\nPage 1 of Jane Doe"
+    assert format_cls.part_spans[1] == ("word/header1.xml", header_start, header_start)
+
+    # the indices of the footer don't depend on the emptied header
+    footer_start = format_cls.part_spans[2][1]
+    assert footer_start == header_start + 2
+    format_cls.add_alter(header_start - 1, footer_start + 4, "X")  # from the separator over the emptied header
+    format_cls.apply_alters()
+    assert format_cls.text == docx_text + "\n\n\n\nX 1 of Jane Doe"
+
+    format_again = DocxFormat()
+    format_again.load(format_cls.bytes)
+    assert format_again.text == docx_text + "\n\nX 1 of Jane Doe"
+
+
+def test_only_touched_parts_are_rebuilt(parts_docx_bytes):
+    format_cls = DocxFormat()
+    format_cls.load(parts_docx_bytes)
+    footer_start = format_cls.part_spans[2][1]
+    format_cls.add_alter(footer_start + 10, footer_start + 18, "XXX")
+    format_cls.apply_alters()
+
+    original = zipfile.ZipFile(io.BytesIO(parts_docx_bytes))
+    altered = zipfile.ZipFile(io.BytesIO(format_cls.bytes))
+    for zinfo in original.infolist():
+        altered_zinfo = altered.getinfo(zinfo.filename)
+        assert (altered_zinfo.CRC == zinfo.CRC) == (zinfo.filename != "word/footer1.xml")
@@ -0,0 +1,42 @@
+import re
+
+import pytest
+
+from expose_text.formats.markup.utils import ExtractionProgram, Rule
+
+
+def test_rules_are_applied_in_order():
+    program = ExtractionProgram([Rule(r"<[^>]+>"), Rule(r"&lt;", replace_with="<")])
+    text, mapping = program.run("<b>&lt;a</b>")
+    assert text == "<a"
+    assert list(mapping) == [3, 7]
+
+
+def test_replacements_forming_new_matches():
+    program = ExtractionProgram([Rule(r"&amp;", replace_with="&")])
+    text, mapping = program.run("x&amp;amp;y")
+    assert text == "x&y"
+    assert list(mapping) == [0, 1, 10]
+
+
+def test_multiline_rules():
+    program = ExtractionProgram([Rule(r"^ +", flags=re.MULTILINE), Rule(r"\n{3,}", replace_with="\n\n")])
+    text, mapping = program.run("  a\n\n\n\n b")
+    assert text == "a\n\nb"
+    assert list(mapping) == [2, 3, 4, 8]
+
+
+def test_too_long_replacement():
+    program = ExtractionProgram([Rule(r"a", replace_with="bb")])
+    with pytest.raises(ValueError):
+        program.run("a")
+
+
+def test_mapping_is_stored_as_runs():
+    program = ExtractionProgram([Rule(r"<[^>]+>")])
+    text, mapping = program.run("<p>" + "x" * 1000 + "</p><p>" + "y" * 1000 + "</p>")
+    assert len(mapping) == len(text) == 2000
+    assert len(list(mapping.runs())) == 2
+    assert mapping[999] == 1002
+    assert mapping[1000] == 1010
+    assert mapping[-1] == 2009
@@ -1,8 +1,10 @@
 import filecmp
+import os
 
 import pytest
 
 from expose_text import FileWrapper, UnsupportedFormat
+from expose_text.formats import registry
 
 
 def test_unsupported_format(test_files):
@@ -30,6 +32,14 @@ def test_load_and_save_for_string(test_files, tmp_path):
     assert filecmp.cmp(file_path, result_path, shallow=False)
 
 
+def test_format_as_string(test_files):
+    file_wrapper = FileWrapper(test_files / "test.txt", ".html")
+    assert isinstance(file_wrapper.file, registry.find_format(".html"))
+
+    with pytest.raises(UnsupportedFormat):
+        FileWrapper(test_files / "test.txt", ".bar")
+
+
 def test_alter_file(test_files, tmp_path):
     file_path = test_files / "test.txt"
     altered_file_path = test_files / "test_altered.txt"
@@ -41,3 +51,90 @@ def test_alter_file(test_files, tmp_path):
     file_wrapper.save(tmp_out_path)
 
     assert filecmp.cmp(altered_file_path, tmp_out_path, shallow=False)
+
+
+def test_batch(test_files):
+    file_wrapper = FileWrapper(test_files / "doctest.txt")
+    applied = []
+    apply_alters = file_wrapper.file.apply_alters
+    file_wrapper.file.apply_alters = lambda: applied.append(True) or apply_alters()
+
+    with file_wrapper.batch():
+        file_wrapper[0:4] = "That"
+        file_wrapper[12:19] = "new content"
+        file_wrapper[12:15] = "old"
+        file_wrapper[33] = "!"
+        assert file_wrapper.text == "This is the content as string."
+
+    assert file_wrapper.text == "That is the old content as string!"
+    assert len(applied) == 1
+
+
+def test_batch_is_discarded_on_error(test_files):
+    file_wrapper = FileWrapper(test_files / "doctest.txt")
+
+    with pytest.raises(KeyError):
+        with file_wrapper.batch():
+            file_wrapper[0:4] = "That"
+            raise KeyError()
+
+    assert file_wrapper.text == "This is the content as string."
+    file_wrapper[0:4] = "That"
+    assert file_wrapper.text == "That is the content as string."
+
+
+@pytest.mark.parametrize("file_name", ["test.txt", "test.html", "test.docx", "pdf/doc.pdf"])
+def test_bytes_are_cached_until_altered(test_files, file_name):
+    file_wrapper = FileWrapper(test_files / file_name)
+    assert not file_wrapper.dirty
+    bytes_ = file_wrapper.bytes
+    assert file_wrapper.bytes is bytes_
+
+    file_wrapper[0:1] = "T"
+    assert file_wrapper.dirty
+    assert file_wrapper.bytes is not bytes_
+    assert file_wrapper.bytes is file_wrapper.bytes
+
+
+@pytest.mark.parametrize("file_name", ["test.txt", "test.html", "test.docx", "pdf/doc.pdf"])
+def test_reloading_resets_bytes(test_files, file_name):
+    bytes_ = (test_files / file_name).read_bytes()
+    format_cls = registry.find_format(os.path.splitext(file_name)[1])
+    loaded_once = format_cls()
+    loaded_once.load(bytes_)
+    unaltered_bytes = loaded_once.bytes
+
+    reloaded = format_cls()
+    reloaded.load(bytes_)
+    reloaded.add_alter(0, 1, "#")
+    reloaded.apply_alters()
+    assert reloaded.bytes != unaltered_bytes
+
+    reloaded.add_alter(1, 2, "#")  # queued alterations are dropped too
+    reloaded.load(bytes_)
+    assert not reloaded.dirty
+    assert reloaded.bytes == unaltered_bytes
+
+
+@pytest.mark.parametrize("file_name", ["test.txt", "test.html", "test.docx", "pdf/doc.pdf"])
+def test_unaltered_input_is_returned(test_files, tmp_path, file_name):
+    file_path = test_files / file_name
+    result_path = tmp_path / "out"
+
+    file_wrapper = FileWrapper(file_path)
+    file_wrapper.add_alters([], [], [])
+    file_wrapper.apply_alters()
+    file_wrapper.save(result_path)
+
+    assert not file_wrapper.dirty
+
+    assert file_wrapper.bytes == file_path.read_bytes()
+    assert filecmp.cmp(file_path, result_path, shallow=False)
+
+
+def test_save_unaltered_to_input_path(tmp_path):
+    file_path = tmp_path / "test.txt"
+    file_path.write_bytes(b"Some text")
+
+    FileWrapper(file_path).save(file_path)
+    assert file_path.read_bytes() == b"Some text"
@@ -3,7 +3,8 @@ import filecmp
 import pytest
 
 from expose_text import FileWrapper
-from expose_text.formats._html import HtmlFormat
+from expose_text.formats._html import HtmlFormat, HtmlMapper, split_html, to_unicode
+from expose_text.formats.markup.utils import find_tags
 
 ENCODING = "UTF-8"
 
@@ -213,3 +214,83 @@ def test_alter_file(test_files, tmp_path):
     file_wrapper.save(tmp_out_path)
 
     assert filecmp.cmp(altered_file_path, tmp_out_path, shallow=False)
+
+
+def test_multiple_rounds_of_alterations(format_cls):
+    format_cls.add_alter(0, 6, "<Deutscher>")
+    format_cls.apply_alters()
+    format_cls.add_alter(1, 10, "Ein")
+    format_cls.add_alter(12, 21, "Paragraph")
+    format_cls.apply_alters()
+    format_cls.add_alter(0, 5, "")
+    format_cls.apply_alters()
+    assert format_cls.text == " Paragraph\n1. … macht mich glücklich"
+    assert format_cls.bytes == '<div class="foo"><h1> Paragraph</h1>\n' "<p>1. … macht mich glücklich</p></div>".encode(
+        ENCODING
+    )
+
+
+def test_altering_escaped_characters():
+    html_bytes = "<p>a &lt;b&gt; c</p>".encode(ENCODING)
+    format_cls = HtmlFormat()
+    format_cls.load(html_bytes)
+    format_cls.add_alter(2, 5, "d")
+    format_cls.apply_alters()
+    assert format_cls.text == "a d c"
+    assert format_cls.bytes == "<p>a d c</p>".encode(ENCODING)
+
+
+def test_altering_linebreaks():
+    format_cls = HtmlFormat()
+    format_cls.load("<p>a<br/>b</p>".encode(ENCODING))
+    format_cls.add_alter(0, 2, "x")
+    format_cls.apply_alters()
+    assert format_cls.text == "xb"
+    assert format_cls.bytes == "<p>x<br/>b</p>".encode(ENCODING)
+
+
+@pytest.mark.parametrize(
+    "head",
+    ['<meta charset="windows-1252">', "<meta http-equiv='Content-Type' content='text/html; charset=windows-1252'>"],
+)
+def test_declared_encodings(head):
+    html_bytes = f"<html><head>{head}</head><body><p>Grüße &amp; Küsse &ndash; €5</p></body></html>".encode("windows-1252")
+    format_cls = HtmlFormat()
+    format_cls.load(html_bytes)
+    assert format_cls.text == "Grüße & Küsse – €5"
+
+
+def test_skipped_content():
+    html_bytes = (
+        "<html><head><title>Title</title><style>p { color: red; }</style></head>\n"
+        '<body class="main"><p>Visible<br/>text</p><script>var a = "<p>hidden</p>";</script>'
+        "<template><p>Hidden</p></template><!-- comment --><p>More <b>text</b></p></body>\n"
+        "<p>Outside</p></html>"
+    ).encode(ENCODING)
+    format_cls = HtmlFormat()
+    format_cls.load(html_bytes)
+    assert format_cls.text == "Visible\ntextMore text"
+
+
+def test_chunk_parallel_extraction(test_files):
+    html = to_unicode((test_files / "test.html").read_bytes())
+    text, mapping = HtmlMapper(html).simultaneous_text_extraction_and_mapping()
+
+    parallel_mapper = HtmlMapper(html, max_workers=2, chunk_size=100)
+    parallel_text, parallel_mapping = parallel_mapper.simultaneous_text_extraction_and_mapping()
+    assert parallel_text == text
+    assert list(parallel_mapping) == list(mapping)
+    assert parallel_mapper.tags == find_tags(html)
+
+
+@pytest.mark.parametrize(
+    "html, bounds",
+    [
+        ("<p>A</p><script>x > y</script><p>B</p>", [(0, 8), (8, 30), (30, 38)]),
+        ("<p>A</p><script><!--</script><p>B</p>", [(0, 8), (8, 29), (29, 37)]),  # a comment opened in a script
+        ("<p>A</p><!-- <style> --><p>B</p>", [(0, 8), (8, 24), (24, 32)]),  # a style opened in a comment
+        ("<p>A</p><style>p {} <p>B</p>", [(0, 8), (8, 28)]),  # never closed
+    ],
+)
+def test_split_html(html, bounds):
+    assert split_html(html, 5) == bounds
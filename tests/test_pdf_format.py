@@ -3,6 +3,7 @@ from pathlib import Path
 import pytest
 
 from expose_text import FileWrapper
+from expose_text.formats._pdf import PdfFormat
 from expose_text.formats.pdf.pdf2html2pdf import Pdf2Html2PdfFormat
 
 black_square = u"\u25A0"
@@ -45,3 +46,112 @@ def test_pdf_text(tmp_files, test_files):
 
 def test_check_dependencies():
     print(Pdf2Html2PdfFormat().is_installed())
+
+
+@pytest.fixture
+def pdf_format(test_files):
+    pdf_format = PdfFormat()
+    with open(test_files / "doc.pdf", "rb") as f:
+        pdf_format.load(f.read())
+    return pdf_format
+
+
+def test_slicing_without_joined_text(pdf_format):
+    text = pdf_format.text
+    pdf_format._invalidate_text()
+
+    assert pdf_format[0:9] == text[0:9] == "Deutscher"
+    assert pdf_format[100:2700] == text[100:2700]
+    assert pdf_format[-5:] == text[-5:]
+    assert pdf_format[9] == text[9]
+    assert pdf_format._text is None
+
+
+def test_page_span(pdf_format):
+    spans = [pdf_format.page_span(page) for page in range(len(pdf_format.document.pages))]
+    assert spans[0][0] == 0
+    assert spans[-1][1] == len(pdf_format.text)
+    assert all(end == start for (_, end), (start, _) in zip(spans, spans[1:]))
+
+
+def test_text_is_updated_after_alterations(pdf_format):
+    pdf_format.text
+    pdf_format.add_alter(0, 9, "Deutsches")
+    pdf_format.apply_alters()
+    assert pdf_format.text[:9] == "Deutsches"
+    assert pdf_format[0:9] == "Deutsches"
+
+
+def test_multiple_alterations_within_and_across_tokens(pdf_format):
+    text = pdf_format.text
+    alters = [(0, 2, "de"), (4, 9, "sche"), (15, 24, "tag"), (5000, 5003, "")]
+    for alter in alters:
+        pdf_format.add_alter(*alter)
+    pdf_format.apply_alters()
+
+    expected = text
+    for start, end, new_text in reversed(alters):
+        expected = expected[:start] + new_text + expected[end:]
+    assert pdf_format.text == expected
+
+
+def test_pages_are_tokenized_lazily(test_files, pdf_format):
+    with open(test_files / "doc.pdf", "rb") as f:
+        bytes_ = f.read()
+    lazy_format = PdfFormat()
+    lazy_format.load(bytes_)
+    assert lazy_format.page_count == pdf_format.page_count > 1
+
+    last_page = lazy_format.page_count - 1
+    start, end = pdf_format.page_span(last_page)
+    assert lazy_format.page_text(last_page) == pdf_format.text[start:end]
+    assert list(lazy_format._page_layers) == [last_page]
+
+
+def test_load_selected_pages(test_files, pdf_format):
+    with open(test_files / "doc.pdf", "rb") as f:
+        bytes_ = f.read()
+    first_page_format = PdfFormat()
+    first_page_format.load(bytes_, pages=range(1))
+    start, end = pdf_format.page_span(0)
+    other_pages_text = pdf_format.text[end:]
+    assert first_page_format.text == pdf_format.text[start:end]
+
+    first_page_format.add_alter(0, 9, "Deutsches")
+    first_page_format.apply_alters()
+    assert list(first_page_format._page_layers) == [0]
+
+    pdf_format.load(first_page_format.bytes)
+    assert pdf_format.text == first_page_format.text + other_pages_text
+    assert pdf_format.text.startswith("Deutsches")
+
+
+def test_pages_tokenized_on_process_pool(test_files, pdf_format):
+    with open(test_files / "doc.pdf", "rb") as f:
+        bytes_ = f.read()
+    parallel_format = PdfFormat()
+    parallel_format.max_workers = 2
+    parallel_format.load(bytes_)
+    assert parallel_format.text == pdf_format.text
+    assert [t.page for t in parallel_format.text_tokens] == [t.page for t in pdf_format.text_tokens]
+    assert parallel_format._fontcache == pdf_format._fontcache
+
+    for format_ in (parallel_format, pdf_format):
+        format_.add_alter(0, 9, "Deutsches")
+        format_.apply_alters()
+    assert parallel_format.bytes == pdf_format.bytes
+
+
+def test_only_dirty_pages_are_rewritten(pdf_format):
+    text = pdf_format.text
+    contents = [page.Contents for page in pdf_format.document.pages]
+    pdf_format.add_alter(0, 9, "Deutsches")
+    pdf_format.apply_alters()
+
+    pages = pdf_format.document.pages
+    assert pages[0].Contents is not contents[0]
+    assert all(page.Contents is original for page, original in zip(pages[1:], contents[1:]))
+    assert pages[1].Contents.Filter == "/FlateDecode"
+
+    pdf_format.load(pdf_format.bytes)
+    assert pdf_format.text == "Deutsches" + text[9:]
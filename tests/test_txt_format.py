@@ -1,6 +1,10 @@
+import codecs
+import mmap
+
 import pytest
 
-from expose_text.formats._txt import TxtFormat
+from expose_text import FileWrapper
+from expose_text.formats._txt import StreamingTxtFormat, TxtFormat
 
 ENCODING = "UTF-8"
 
@@ -42,3 +46,111 @@ def test_encodings(encoding):
     format_cls.load(encoded_string)
     assert format_cls.bytes == encoded_string
     assert format_cls.text == encoded_string.decode(encoding)
+
+
+@pytest.mark.parametrize(
+    "encoding,strategy",
+    [("utf-8", "utf-8"), ("utf-8-sig", "bom"), ("utf-16", "bom"), ("utf-32", "bom"), ("windows-1252", "chardet")],
+)
+def test_encoding_detection_strategies(encoding, strategy):
+    encoded_string = ("¾ der Mäuse sind weiß. " * 20).encode(encoding)
+    format_cls = TxtFormat()
+    format_cls.load(encoded_string)
+    assert format_cls.strategy == strategy
+    assert format_cls.text == encoded_string.decode(encoding)
+    assert format_cls.bytes == encoded_string
+
+
+def test_reloading_without_bom():
+    format_cls = TxtFormat()
+    format_cls.load("Die Mäuse".encode("utf-8-sig"))
+    assert (format_cls.encoding, format_cls.text) == ("utf-8-sig", "Die Mäuse")
+
+    format_cls.load("Die Mäuse".encode("utf-8"))
+    assert (format_cls.encoding, format_cls.text) == ("utf-8", "Die Mäuse")
+    assert format_cls.bytes == "Die Mäuse".encode("utf-8")
+
+
+def test_chardet_looks_at_sample_only(monkeypatch):
+    detected = []
+    monkeypatch.setattr(
+        "expose_text.formats._txt.chardet.detect",
+        lambda bytes_: detected.append(bytes_) or {"encoding": "cp1252", "confidence": 0.9},
+    )
+    format_cls = TxtFormat(sample_size=10)
+    format_cls.load("Die Mäuse".encode("cp1252") * 10)
+    assert detected == ["Die Mäuse".encode("cp1252") + b"D"]
+    assert (format_cls.encoding, format_cls.confidence, format_cls.strategy) == ("cp1252", 0.9, "chardet")
+
+
+def test_fallback_on_low_confidence():
+    encoded_string = "Mäuse".encode("cp1252")
+    format_cls = TxtFormat(min_confidence=0.99)
+    format_cls.load(encoded_string)
+    assert (format_cls.encoding, format_cls.strategy) == ("latin-1", "fallback")
+    assert format_cls.bytes == encoded_string
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-8-sig", "utf-16", "windows-1252"])
+def test_streaming_format(encoding):
+    encoded_string = ("¾ der Mäuse sind weiß. " * 20).encode(encoding)
+    format_cls = TxtFormat()
+    format_cls.load(encoded_string)
+    streaming_format = StreamingTxtFormat(chunk_size=16)
+    streaming_format.load(encoded_string)
+    assert streaming_format.encoding == format_cls.encoding
+    assert streaming_format.text == format_cls.text
+    assert streaming_format[30:50] == format_cls.text[30:50]
+
+    for format_ in [format_cls, streaming_format]:
+        format_.add_alter(2, 5, "die")
+        format_.add_alter(40, 90, "")
+        format_.add_alter(100, 101, "Mäuse")
+        format_.apply_alters()
+        format_.add_alter(0, 7, "")
+        format_.apply_alters()
+    assert streaming_format.text == format_cls.text
+    assert streaming_format[95:120] == format_cls.text[95:120]
+    assert streaming_format[-1] == format_cls.text[-1]
+    assert len(streaming_format) == len(format_cls.text)
+    assert streaming_format.bytes == format_cls.bytes
+
+
+def test_streaming_file(tmp_path):
+    file_path = tmp_path / "test.txt"
+    file_path.write_bytes("Hans Müller wohnt in Berlin.\n".encode() * 1000)
+
+    file_wrapper = FileWrapper(file_path, StreamingTxtFormat)
+    assert isinstance(file_wrapper.file._source.obj, mmap.mmap)
+    file_wrapper.apply_alters()
+    assert not file_wrapper.dirty
+    file_wrapper[5:11] = "M."
+    file_wrapper.save(file_path)
+    assert file_path.read_bytes() == "Hans M. wohnt in Berlin.\n".encode() + "Hans Müller wohnt in Berlin.\n".encode() * 999
+
+
+def test_untouched_bytes_are_kept():
+    # Python would encode "utf-16" as little endian
+    encoded_string = codecs.BOM_UTF16_BE + "Die Mäuse sind weiß.".encode("utf-16-be")
+    format_cls = TxtFormat(chunk_size=8)
+    format_cls.load(encoded_string)
+    format_cls.add_alter(4, 9, "Katzen")
+    format_cls.apply_alters()
+    assert format_cls.text == "Die Katzen sind weiß."
+    assert format_cls.bytes == codecs.BOM_UTF16_BE + "Die Katzen sind weiß.".encode("utf-16-be")
+
+
+@pytest.mark.parametrize("format_type", [TxtFormat, StreamingTxtFormat])
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-16-le", "latin-1"])
+def test_rounds_of_alterations_across_chunks(format_type, encoding):
+    # chunks with plain ASCII and ones with wider characters
+    text = "Hans Müller wohnt in Berlin. " * 5 + "Hans Schmidt wohnt in Bonn. " * 5
+    format_cls = format_type(chunk_size=16)
+    format_cls.load(text.encode(encoding))
+    for start in range(len(text) - 10, 0, -15):
+        format_cls.add_alter(start, start + 4, "Ä")
+        format_cls.add_alter(start + 6, start + 7, "ß!")
+        format_cls.apply_alters()
+        text = text[:start] + "Ä" + text[start + 4 : start + 6] + "ß!" + text[start + 7 :]
+    assert format_cls.text == text
+    assert format_cls.bytes == text.encode(encoding)